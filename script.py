@@ -3,175 +3,2011 @@
 # - Cálculo da concentração por adição de padrão
 # - Desvio (incerteza) da concentração
 # - Substituição de "x when y=0" por "[caffeic acid] (concentração)"
+#
+# Também pode ser importado como biblioteca:
+#
+#     import script
+#     result = script.analyze(['data.xlsx'], unit='micromolar')
+#     result.to_frame()            # tabela tipada, uma linha por planilha
+#     result.sheet(0).conc         # resultados de uma planilha
+
+from __future__ import annotations
+
+import time
+_START = time.perf_counter()
 
-import pandas as pd
-import numpy as np
-import matplotlib.pyplot as plt
-from scipy.stats import linregress, f
 import os
 import argparse
+import csv
+import functools
+import glob
+import hashlib
+import importlib.util
+import json
+import re
+import shutil
+import sys
+import warnings
+from dataclasses import asdict, dataclass, field, replace
+from datetime import datetime, time as time_of_day, timedelta, timezone
 
-# 1️⃣ Parser
-parser = argparse.ArgumentParser(description="Process Excel data and plot AUC with regression and ANOVA analysis")
-parser.add_argument("-i", "--input", required=True, help="Input Excel file")
-parser.add_argument("-u", "--unit", choices=["micromolar", "millimolar"], default="micromolar", help="Unit for caffeic acid concentration (micromolar or millimolar)")
-args = parser.parse_args()
+# Heavy dependencies are imported lazily: numpy and pandas on first attribute
+# access, scipy only inside the F test and matplotlib only when a plot is drawn,
+# so --help, argument errors and the 'plot' command skip what they do not use
+def _lazy_import(name):
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
 
-# 2️⃣ Map user input to chemical symbol
+np = _lazy_import('numpy')
+pd = _lazy_import('pandas')
+
+# Map user input to chemical symbol
 unit_map = {
     "micromolar": "µM",
     "millimolar": "mM"
 }
-unit_symbol = unit_map[args.unit]
-
-excel_file = args.input
-print(f"📂 Input file: {excel_file}")
-print(f"⚗️ Unit for caffeic acid: {unit_symbol}")
-
-# 3️⃣ Get sheet names
-sheets = pd.ExcelFile(excel_file).sheet_names
-
-# Create folder for saving graphs
-output_folder = 'Results/graphs'
-os.makedirs(output_folder, exist_ok=True)
-
-summary_data = []
-
-# 4️⃣ Loop through sheets
-for sheet_name in sheets:
-    df = pd.read_excel(excel_file, sheet_name=sheet_name, header=None)
-
-    # Extract time vector
-    time = df.iloc[3:33, 0].replace(r'[^\d.-]', '', regex=True).apply(pd.to_numeric, errors='coerce').reset_index(drop=True)
-
-    # Group columns (3 replicates + 1 skip)
-    cols = list(range(1, df.shape[1]))
-    grouped_cols = []
-    for i in range(0, len(cols), 4):
-        group = tuple(cols[i:i+3])
-        if len(group) == 3:
-            grouped_cols.append(group)
-
-    mean_areas, std_areas, labels = [], [], []
-
-    for group in grouped_cols:
-        c1, c2, c3 = group
-        sub = df.iloc[3:33, [c1, c2, c3]].replace(r'[^\d.-]', '', regex=True).apply(pd.to_numeric, errors='coerce')
-        areas = [np.trapz(sub.iloc[:, i], time) for i in range(sub.shape[1])]
-        mean_areas.append(np.mean(areas))
-        std_areas.append(np.std(areas, ddof=1))
-        cell_name = str(df.iloc[0, c1])
-        number = ''.join(filter(lambda x: x.isdigit() or x == '.', cell_name))
+
+REPLICATES = 3
+FIRST_ROW, LAST_ROW = 3, 33
+DILUTION_FACTOR = 20
+VOLUME_CORRECTION = 0.99
+LOD_FACTOR, LOQ_FACTOR = 3.3, 10
+# Assay constants applied after the fit; each can be set per run and overridden per sheet
+DEFAULT_CONSTANTS = {
+    'dilution_factor': DILUTION_FACTOR,
+    'volume_correction': VOLUME_CORRECTION,
+    'lod_factor': LOD_FACTOR,
+    'loq_factor': LOQ_FACTOR,
+}
+METADATA_SHEET = 'metadata'
+TIME_UNIT = 'min'
+TIME_UNITS = {'ms': 1e-3, 's': 1.0, 'min': 60.0, 'h': 3600.0}  # seconds per unit
+MANIFEST_EXTENSIONS = ('.txt', '.lst')
+INPUT_EXTENSIONS = ('.xlsx', '.csv', '.tsv')
+
+# Sheet layout
+
+@dataclass(frozen=True)
+class Layout:
+    """Where the data sits in a sheet, as 0-based rows and columns.
+
+    Time points are read from rows first_row to last_row (exclusive; None reads
+    to the end of the sheet). Replicate wells start at first_column in groups of
+    ``replicates`` columns separated by ``spacer`` columns, and each group's
+    concentration is read from its first column in label_row. Time points are
+    converted to time_unit, which is also assumed for bare numbers when the
+    header above the time column names no unit.
+    """
+    first_row: int = FIRST_ROW
+    last_row: int | None = LAST_ROW
+    time_column: int = 0
+    label_row: int = 0
+    first_column: int = 1
+    replicates: int = REPLICATES
+    spacer: int = 1
+    time_unit: str = TIME_UNIT
+
+    def __post_init__(self):
+        if min(self.first_row, self.time_column, self.label_row, self.first_column, self.spacer) < 0:
+            raise ValueError('layout rows and columns cannot be negative')
+        if self.replicates < 1:
+            raise ValueError('layout needs at least 1 replicate')
+        if self.last_row is not None and self.last_row <= self.first_row:
+            raise ValueError('layout last_row must be greater than first_row')
+        if self.time_unit not in TIME_UNITS:
+            raise ValueError(f"layout time_unit must be one of: {', '.join(TIME_UNITS)}")
+
+    @classmethod
+    def from_json(cls, path: str) -> Layout:
+        with open(path, encoding='utf-8') as handle:
+            fields = json.load(handle)
+        unknown = set(fields) - set(cls.__dataclass_fields__)
+        if unknown:
+            raise ValueError(f"unknown layout field(s) in {path}: {', '.join(sorted(unknown))}")
+        return cls(**fields)
+
+    # Compiled once per sheet shape: the time rows and a (levels, replicates) array of well columns
+    @functools.lru_cache(maxsize=None)
+    def compile(self, n_rows: int, n_columns: int) -> tuple[np.ndarray, np.ndarray]:
+        stop = n_rows if self.last_row is None else min(self.last_row, n_rows)
+        rows = np.arange(self.first_row, max(stop, self.first_row))
+        step = self.replicates + self.spacer
+        n_levels = max(0, (n_columns - self.first_column + self.spacer) // step)
+        wells = self.first_column + step * np.arange(n_levels)[:, np.newaxis] + np.arange(self.replicates)
+        return rows, wells
+
+DEFAULT_LAYOUT = Layout()
+
+# Result objects
+
+@dataclass
+class Plate:
+    """Raw data of every loaded sheet, padded into (sheets, ...) arrays."""
+    sources: list[str]
+    sheet_names: list[str]
+    time: np.ndarray            # (sheets, timepoints)
+    rlu: np.ndarray             # (sheets, timepoints, wells)
+    concentrations: np.ndarray  # (sheets, levels), NaN padded
+    n_levels: np.ndarray        # (sheets,)
+    errors: list[str | None]
+    digests: list[str | None]
+    replicates: int = REPLICATES
+    coerced: list[list[str]] = field(default_factory=list)  # text cells converted to numbers, per sheet
+    time_unit: str = TIME_UNIT
+    overrides: list[dict[str, float]] = field(default_factory=list)  # constants from the workbook's metadata sheet
+
+    @property
+    def level_mask(self) -> np.ndarray:
+        return np.arange(self.concentrations.shape[1]) < self.n_levels[:, np.newaxis]
+
+@dataclass
+class AucResult:
+    replicate_auc: np.ndarray   # (sheets, levels, replicates)
+    mean_auc: np.ndarray        # (sheets, levels)
+    sd_auc: np.ndarray          # (sheets, levels)
+    rejected: np.ndarray | None = None  # (sheets, levels, replicates) wells left out as outliers
+
+@dataclass
+class FitResult:
+    """Standard-addition regression and ANOVA, one value per sheet."""
+    slope: np.ndarray
+    intercept: np.ndarray
+    r: np.ndarray
+    s_yx: np.ndarray
+    se_slope: np.ndarray
+    se_intercept: np.ndarray
+    F: np.ndarray
+    p: np.ndarray
+    conc: np.ndarray
+    conc_err: np.ndarray
+
+@dataclass
+class LackOfFit:
+    """Lack-of-fit test of a fit on the replicate AUCs, one value per sheet."""
+    ss_lack: np.ndarray  # level means around the line, (levels - 2) degrees of freedom
+    ss_pure: np.ndarray  # replicates around their level mean, levels * (replicates - 1) degrees of freedom
+    F: np.ndarray
+    p: np.ndarray
+
+@dataclass
+class DetectionLimits:
+    LOD: np.ndarray
+    LOQ: np.ndarray
+
+@dataclass
+class SheetResult:
+    """Everything computed for one sheet, as plain scalars and 1-D arrays."""
+    source: str
+    sheet_name: str
+    unit_symbol: str
+    concentrations: np.ndarray
+    mean_auc: np.ndarray
+    sd_auc: np.ndarray
+    slope: float
+    intercept: float
+    r: float
+    s_yx: float
+    se_slope: float
+    se_intercept: float
+    F: float
+    p: float
+    conc: float
+    conc_err: float
+    LOD: float
+    LOQ: float
+    error: str | None = None
+    time_unit: str = TIME_UNIT
+    dilution_factor: float = DILUTION_FACTOR
+    volume_correction: float = VOLUME_CORRECTION
+    lod_factor: float = LOD_FACTOR
+    loq_factor: float = LOQ_FACTOR
+    intervals: dict[str, tuple[float, float]] = field(default_factory=dict)  # confidence intervals, see ci_level
+    ci_level: float | None = None
+    fit_method: str = 'ols'
+    lack_of_fit_F: float = float('nan')
+    lack_of_fit_p: float = float('nan')
+    outlier_test: str | None = None
+    rejected_wells: list[str] = field(default_factory=list)  # columns of the replicate wells left out
+    auc_engine: str = 'trapz'
+
+@dataclass
+class AnalysisResult:
+    plate: Plate
+    auc: AucResult
+    fit: FitResult
+    limits: DetectionLimits
+    unit_symbol: str
+    constants: dict[str, np.ndarray] = field(default_factory=dict)  # per-sheet assay constants
+    intervals: dict[str, np.ndarray] = field(default_factory=dict)  # (sheets, 2) lower and upper bounds
+    ci_level: float | None = None
+    fit_method: str = 'ols'
+    weights: np.ndarray | None = None  # (sheets, levels) weights of a weighted fit (WLS or Huber)
+    lack_of_fit: LackOfFit | None = None  # only for a fit on the replicate AUCs
+    outlier_test: str | None = None
+    rejected_wells: list[list[str]] = field(default_factory=list)
+    auc_engine: str = 'trapz'
+
+    def __len__(self) -> int:
+        return len(self.plate.sheet_names)
+
+    def sheet(self, k: int) -> SheetResult:
+        n = self.plate.n_levels[k]
+        return SheetResult(
+            source=self.plate.sources[k],
+            sheet_name=self.plate.sheet_names[k],
+            unit_symbol=self.unit_symbol,
+            concentrations=self.plate.concentrations[k, :n],
+            mean_auc=self.auc.mean_auc[k, :n],
+            sd_auc=self.auc.sd_auc[k, :n],
+            **{name: float(getattr(self.fit, name)[k]) for name in FitResult.__dataclass_fields__},
+            LOD=float(self.limits.LOD[k]),
+            LOQ=float(self.limits.LOQ[k]),
+            error=self.plate.errors[k],
+            time_unit=self.plate.time_unit,
+            **{name: float(values[k]) for name, values in self.constants.items()},
+            intervals={name: tuple(float(bound) for bound in bounds[k]) for name, bounds in self.intervals.items()},
+            ci_level=self.ci_level,
+            fit_method=self.fit_method,
+            **({} if self.lack_of_fit is None else
+               {'lack_of_fit_F': float(self.lack_of_fit.F[k]), 'lack_of_fit_p': float(self.lack_of_fit.p[k])}),
+            outlier_test=self.outlier_test,
+            rejected_wells=self.rejected_wells[k] if self.rejected_wells else [],
+            auc_engine=self.auc_engine,
+        )
+
+    def sheets(self) -> list[SheetResult]:
+        return [self.sheet(k) for k in range(len(self))]
+
+    def to_frame(self, errors: list[str | None] | None = None) -> pd.DataFrame:
+        return build_results_table(self, self.plate.errors if errors is None else errors)
+
+    def bootstrap(self, n_resamples: int = 10000, level: float = 0.95, seed: int = 0) -> dict[str, np.ndarray]:
+        """Percentile intervals of conc_well, slope and lod from resampled replicates; kept in self.intervals."""
+        self.intervals.update(bootstrap_intervals(self, n_resamples, level, seed))
+        self.ci_level = level
+        return self.intervals
+
+    def monte_carlo(self, n_draws: int = 100000, level: float = 0.95, seed: int = 0, mode: str = 'covariance') -> dict[str, np.ndarray]:
+        """Percentile intervals of conc_well, conc_sample, lod and loq by Monte Carlo propagation; kept in self.intervals."""
+        self.intervals.update(monte_carlo_intervals(self, n_draws, level, seed, mode))
+        self.ci_level = level
+        return self.intervals
+
+    def sweep(self, name: str, values) -> pd.DataFrame:
+        """Derived columns of every sheet for each value of one assay constant, reusing the fit."""
+        return sweep_constants(self, name, values)
+
+# Loading
+
+# Single-pass loader: open the workbook once and stream every sheet's raw block
+def iter_sheets(path, sheet_column=None):
+    if os.path.splitext(path)[1].lower() in ('.csv', '.tsv'):
+        yield from iter_delimited_sheets(path, sheet_column)
+        return
+    with pd.ExcelFile(path) as workbook:
+        for sheet_name in workbook.sheet_names:
+            yield sheet_name, workbook.parse(sheet_name, header=None)
+
+# Plate-reader CSV/TSV exports, read with pandas' C parser. Without sheet_column the
+# file holds one sheet named after the file; otherwise that column (0-based) holds
+# the sheet name of each row and is dropped, leaving the usual sheet layout
+def iter_delimited_sheets(path, sheet_column=None):
+    sep = '\t' if path.lower().endswith('.tsv') else ','
+    # The C parser takes the column count from the first line; exports often start
+    # with a short title line ("Plate 1"), so the widest line sets it instead
+    with open(path, newline='', encoding='utf-8-sig', errors='replace') as handle:
+        width = max((len(row) for row in csv.reader(handle, delimiter=sep)), default=0)
+    df = pd.read_csv(path, sep=sep, header=None, names=range(width), engine='c', skip_blank_lines=False)
+    if sheet_column is None:
+        yield os.path.splitext(os.path.basename(path))[0], df
+        return
+    if sheet_column >= df.shape[1]:
+        raise ValueError(f'sheet column {sheet_column} not found, {path} has {df.shape[1]} columns')
+    ids = df.iloc[:, sheet_column]
+    if ids.isna().all():
+        raise ValueError(f'sheet column {sheet_column} of {path} is empty')
+    df = df.drop(columns=df.columns[sheet_column])
+    df.columns = range(df.shape[1])
+    for sheet_name in ids.dropna().unique():
+        block = df[(ids == sheet_name).to_numpy()].reset_index(drop=True)
+        # Narrower sheets are padded by the widest one; drop their trailing empty columns
+        used = np.flatnonzero(block.notna().any().to_numpy())
+        yield str(sheet_name), block.iloc[:, :used[-1] + 1 if used.size else 0]
+
+# Extract time vector, replicate wells and concentration labels of one sheet
+# Numeric coercion: numeric cells are taken as they are and text that already reads
+# as a number is parsed in one vectorized call; only the remaining text cells
+# ("0.5 s", "1 min") fall back to stripping everything but digits, '.' and '-'
+_NON_NUMERIC = re.compile(r'[^\d.-]')
+
+def coerce_numeric(cells: pd.DataFrame) -> tuple[np.ndarray, np.ndarray]:
+    """Float64 values of a cell block and a mask of the text cells that had to be cleaned."""
+    raw = cells.to_numpy()
+    if raw.dtype.kind in 'biuf':
+        return raw.astype(float), np.zeros(raw.shape, dtype=bool)
+    flat = pd.Series(raw.ravel())
+    values = pd.to_numeric(flat, errors='coerce')
+    coerced = values.isna() & flat.notna()
+    if coerced.any():
+        cleaned = flat[coerced].astype(str).str.replace(_NON_NUMERIC, '', regex=True)
+        values[coerced] = pd.to_numeric(cleaned, errors='coerce')
+    return values.to_numpy(dtype=float).reshape(raw.shape), coerced.to_numpy().reshape(raw.shape)
+
+# Spreadsheet column ("B") and cell reference ("B7") of 0-based positions
+def column_letters(column):
+    letters = ''
+    column += 1
+    while column:
+        column, rest = divmod(column - 1, 26)
+        letters = chr(ord('A') + rest) + letters
+    return letters
+
+def cell_reference(row, column):
+    return f'{column_letters(column)}{row + 1}'
+
+# Time axis: the unit comes from each cell ("30 s", "0:00:30", Excel time cells) or
+# else from the header above the time column ("Time(min)"), and every point is
+# converted to the layout's time unit
+_TIME_UNIT_NAMES = {
+    'ms': 'ms', 'msec': 'ms',
+    's': 's', 'sec': 's', 'secs': 's', 'second': 's', 'seconds': 's',
+    'min': 'min', 'mins': 'min', 'minute': 'min', 'minutes': 'min',
+    'h': 'h', 'hr': 'h', 'hrs': 'h', 'hour': 'h', 'hours': 'h',
+}
+_CLOCK = re.compile(r'^\s*(\d+):(\d{2}):(\d{2}(?:\.\d*)?)\s*$')
+_NUMBER_WITH_UNIT = re.compile(r'^\s*([-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)\s*([a-zA-Z]*)\s*$')
+
+def _header_time_unit(header):
+    # Nearest text cell above the data that looks like a time header: "Time(min)", "t [s]"
+    for text in reversed([str(cell).lower() for cell in header if isinstance(cell, str)]):
+        if 'time' in text or '(' in text or '[' in text:
+            for word in re.findall(r'[a-z]+', text):
+                if word in _TIME_UNIT_NAMES:
+                    return _TIME_UNIT_NAMES[word]
+    return None
+
+# (value, unit) of one time cell; bare numbers are in the given unit
+def _parse_time_cell(value, unit):
+    if isinstance(value, (int, float, np.number)) and not isinstance(value, bool):
+        return float(value), unit
+    if isinstance(value, time_of_day):
+        return value.hour * 3600 + value.minute * 60 + value.second + value.microsecond / 1e6, 's'
+    if isinstance(value, timedelta):
+        return value.total_seconds(), 's'
+    if isinstance(value, str):
+        clock = _CLOCK.match(value)
+        if clock:
+            return int(clock[1]) * 3600 + int(clock[2]) * 60 + float(clock[3]), 's'
+        match = _NUMBER_WITH_UNIT.match(value)
+        if match and match[2].lower() in _TIME_UNIT_NAMES:
+            return float(match[1]), _TIME_UNIT_NAMES[match[2].lower()]
+        if match and not match[2]:
+            return float(match[1]), unit
+    # Anything else keeps the digits-only reading of the numeric coercion
+    try:
+        return float(_NON_NUMERIC.sub('', str(value))), unit
+    except ValueError:
+        return np.nan, unit
+
+def parse_time_axis(header, cells, unit=TIME_UNIT, cache=None):
+    """Time points of one sheet in ``unit``; ``cache`` shares identical axes across a workbook's sheets."""
+    key = (tuple(header), tuple(cells), unit)
+    if cache is not None and key in cache:
+        return cache[key]
+    default_unit = _header_time_unit(header) or unit
+    time = np.array([value * (TIME_UNITS[cell_unit] / TIME_UNITS[unit])
+                     for value, cell_unit in (_parse_time_cell(cell, default_unit) for cell in cells)], dtype=float)
+    if cache is not None:
+        cache[key] = time
+    return time
+
+def extract_sheet(df, layout=DEFAULT_LAYOUT, time_axes=None):
+    rows, wells = layout.compile(*df.shape)
+    if not wells.size:
+        raise ValueError('no replicate columns found')
+
+    time = parse_time_axis(df.iloc[:layout.first_row, layout.time_column].tolist(),
+                           df.iloc[rows, layout.time_column].tolist(), layout.time_unit, time_axes)
+    # One gather for every replicate well, coerced in a single pass
+    rlu, coerced = coerce_numeric(df.iloc[rows, wells.ravel()])
+
+    labels = []
+    for cell_name in df.iloc[layout.label_row, wells[:, 0]]:
+        number = ''.join(filter(lambda x: x.isdigit() or x == '.', str(cell_name)))
         labels.append(float(number) if number else np.nan)
 
-    # Linear regression
-    x = np.array(labels)
-    y = np.array(mean_areas)
-    y_err = np.array(std_areas)
-
-    slope, intercept, r_value, p_value, std_err = linregress(x, y)
-    y_fit = slope * x + intercept
-
-    # ANOVA
-    n = len(x)
-    y_mean = np.mean(y)
-    ss_reg = np.sum((y_fit - y_mean)**2)
-    ss_res = np.sum((y - y_fit)**2)
-    df_reg = 1
-    df_res = n - 2
-    ms_reg = ss_reg / df_reg
-    ms_res = ss_res / df_res
-    F_value = ms_reg / ms_res if ms_res != 0 else np.nan
-    p_anova = 1 - f.cdf(F_value, df_reg, df_res) if not np.isnan(F_value) else np.nan
-
-    # Standard errors
-    s_yx = np.sqrt(ms_res)
-    s_xx = np.sum((x - np.mean(x))**2)
-    se_slope = s_yx / np.sqrt(s_xx)
-    se_intercept = s_yx * np.sqrt(1/n + np.mean(x)**2 / s_xx)
-
-    # Plot
-    plt.figure(figsize=(8, 5))
-    plt.errorbar(x, y, yerr=y_err, fmt='o', capsize=5, markersize=8, color='royalblue')
-    plt.plot(x, y_fit, color='red', linestyle='--', label=f'Linear regression (r={r_value:.4f})')
-    plt.xlabel(f'[Caffeic acid] samples ({unit_symbol})')
-    plt.ylabel('AUC (RLU)')
-    plt.title(f'Average RLU (± SD) — {sheet_name}')
-    plt.ylim(bottom=0)
-    plt.grid(axis='y', linestyle='--', alpha=0.6)
-    plt.legend()
-    plt.tight_layout()
-    filename = os.path.join(output_folder, f"{sheet_name.replace('/', '_')}.png")
-    plt.savefig(filename, dpi=300)
-    plt.close()
-
-    # Concentration by standard addition
-    if slope != 0:
-        conc = -intercept / slope
+    columns = wells.ravel()
+    coerced_cells = [cell_reference(rows[i], columns[j]) for i, j in zip(*np.nonzero(coerced))]
+    return time, rlu, labels, coerced_cells
+
+def _empty_block():
+    return np.empty(0), np.empty((0, 0)), [], []
+
+# Metadata sheet/table: one row per sheet, a 'sheet' column with its name and any
+# of the assay constant columns; empty cells keep the run's value
+def parse_metadata(df) -> dict[str, dict[str, float]]:
+    df = df.rename(columns=lambda column: str(column).strip().lower().replace(' ', '_'))
+    if 'sheet' not in df.columns:
+        raise ValueError("metadata needs a 'sheet' column")
+    columns = [name for name in DEFAULT_CONSTANTS if name in df.columns]
+    if not columns:
+        raise ValueError(f"metadata has none of the columns: {', '.join(DEFAULT_CONSTANTS)}")
+    overrides = {}
+    for row in df.dropna(subset=['sheet']).to_dict('records'):
+        try:
+            overrides[str(row['sheet'])] = {name: float(row[name]) for name in columns if pd.notna(row[name])}
+        except (TypeError, ValueError):
+            raise ValueError(f"metadata for sheet {row['sheet']!r} has a non-numeric value") from None
+    return overrides
+
+def read_metadata(path) -> dict[str, dict[str, float]]:
+    if path.lower().endswith(('.csv', '.tsv')):
+        return parse_metadata(pd.read_csv(path, sep='\t' if path.lower().endswith('.tsv') else ','))
+    return parse_metadata(pd.read_excel(path))
+
+# Read every sheet of a workbook; pack_sheets then stacks them into one
+# contiguous (sheets, timepoints, wells) tensor
+def read_workbook(path, sheet_column=None, layout=DEFAULT_LAYOUT, parse_cache=False):
+    if parse_cache:
+        key = parsed_cache_key(path, sheet_column, layout)
+        cached = load_parsed(path, key)
+        if cached is not None:
+            return cached
+
+    sheet_names, blocks, errors, digests, metadata = [], [], [], [], {}
+    time_axes = {}
+    metadata_ok = True
+    for sheet_name, df in iter_sheets(path, sheet_column):
+        if sheet_name.strip().lower() == METADATA_SHEET:
+            # A malformed metadata sheet is reported and the run constants are used instead
+            try:
+                metadata = parse_metadata(df.iloc[1:].set_axis(df.iloc[0], axis=1))
+            except Exception as exc:
+                metadata_ok = False
+                print(f"⚠️ {path}: metadata sheet ignored, using the run constants ({type(exc).__name__}: {exc})", flush=True)
+            continue
+        digests.append(hash_block(df))
+        # A malformed sheet is recorded and left empty instead of aborting the workbook
+        try:
+            block, error = extract_sheet(df, layout, time_axes), None
+        except Exception as exc:
+            block, error = _empty_block(), f'{type(exc).__name__}: {exc}'
+        sheet_names.append(sheet_name)
+        blocks.append(block)
+        errors.append(error)
+    # Not cached with a broken metadata sheet, so the warning is repeated until it is fixed
+    if parse_cache and metadata_ok:
+        save_parsed(path, key, sheet_names, blocks, errors, digests, metadata)
+    return sheet_names, blocks, errors, digests, metadata
+
+# Batch mode: a workbook that cannot be opened becomes a single error entry
+def read_workbook_or_error(path, sheet_column=None, layout=DEFAULT_LAYOUT, parse_cache=False):
+    try:
+        return read_workbook(path, sheet_column, layout, parse_cache)
+    except Exception as exc:
+        return [''], [_empty_block()], [f'{type(exc).__name__}: {exc}'], [None], {}
+
+# Parsed-block cache: the extracted time points, RLU blocks and labels of every sheet
+# of a workbook, kept next to it as flat .npy arrays plus a JSON manifest. Later runs
+# memory-map the arrays instead of opening the workbook, as long as its size and
+# mtime, the layout and the sheet column are unchanged.
+PARSED_CACHE_VERSION = 2
+
+def parsed_cache_dir(path):
+    folder, name = os.path.split(os.path.abspath(path))
+    return os.path.join(folder, f'.{name}.parsed')
+
+def parsed_cache_key(path, sheet_column, layout):
+    stat = os.stat(path)
+    return {'version': PARSED_CACHE_VERSION, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+            'sheet_column': sheet_column, 'layout': asdict(layout)}
+
+def load_parsed(path, key):
+    folder = parsed_cache_dir(path)
+    try:
+        with open(os.path.join(folder, 'manifest.json'), encoding='utf-8') as handle:
+            manifest = json.load(handle)
+        if manifest['key'] != key:
+            return None
+        time = np.load(os.path.join(folder, 'time.npy'), mmap_mode='r')
+        rlu = np.load(os.path.join(folder, 'rlu.npy'), mmap_mode='r')
+    except (OSError, ValueError, KeyError):
+        return None
+
+    blocks, t0, r0 = [], 0, 0
+    for sheet in manifest['sheets']:
+        rows, wells = sheet['shape']
+        blocks.append((time[t0:t0 + rows], rlu[r0:r0 + rows * wells].reshape(rows, wells), sheet['labels'], sheet['coerced']))
+        t0 += rows
+        r0 += rows * wells
+    sheets = manifest['sheets']
+    return ([sheet['name'] for sheet in sheets], blocks, [sheet['error'] for sheet in sheets],
+            [sheet['digest'] for sheet in sheets], manifest['metadata'])
+
+# A workbook folder that is not writable simply goes without the cache
+def save_parsed(path, key, sheet_names, blocks, errors, digests, metadata):
+    folder = parsed_cache_dir(path)
+    manifest_path = os.path.join(folder, 'manifest.json')
+    try:
+        os.makedirs(folder, exist_ok=True)
+        # The manifest goes last, so a half-written cache is never picked up
+        if os.path.exists(manifest_path):
+            os.remove(manifest_path)
+        # A workbook without data sheets still caches, as empty arrays
+        np.save(os.path.join(folder, 'time.npy'), np.concatenate([np.empty(0)] + [np.asarray(t, dtype=float) for t, *_ in blocks]))
+        np.save(os.path.join(folder, 'rlu.npy'), np.concatenate([np.empty(0)] + [np.asarray(block, dtype=float).ravel() for _, block, *_ in blocks]))
+        manifest = {'key': key, 'metadata': metadata, 'sheets': [
+            {'name': name, 'shape': list(block.shape), 'labels': [float(label) for label in labels],
+             'coerced': coerced, 'error': error, 'digest': digest}
+            for name, (_, block, labels, coerced), error, digest in zip(sheet_names, blocks, errors, digests)]}
+        with open(manifest_path + '.tmp', 'w', encoding='utf-8') as handle:
+            json.dump(manifest, handle, ensure_ascii=False)
+        os.replace(manifest_path + '.tmp', manifest_path)
+    except OSError:
+        pass
+
+def pack_sheets(blocks, replicates=REPLICATES):
+    n_sheets = len(blocks)
+    n_time = max((len(t) for t, *_ in blocks), default=0)
+    n_levels = np.array([len(labels) for _, _, labels, _ in blocks], dtype=int)
+    max_levels = int(n_levels.max(initial=0))
+
+    # Short sheets are padded with repeated time points and zero signal so the
+    # padding adds no area; missing levels are padded with NaN
+    time = np.zeros((n_sheets, n_time))
+    rlu = np.full((n_sheets, n_time, max_levels * replicates), np.nan)
+    concentrations = np.full((n_sheets, max_levels), np.nan)
+    for k, (t, block, labels, _) in enumerate(blocks):
+        rows, wells = block.shape
+        if rows:
+            time[k, :rows] = t
+            time[k, rows:] = t[-1]
+        rlu[k, :rows, :wells] = block
+        rlu[k, rows:, :wells] = 0.0
+        concentrations[k, :len(labels)] = labels
+
+    return time, rlu, concentrations, n_levels
+
+def load_workbooks(paths: list[str], executor=None, sheet_column: int | None = None,
+                   layout: Layout = DEFAULT_LAYOUT, parse_cache: bool = False) -> Plate:
+    """Read one or more workbooks (.xlsx, .csv or .tsv) into a single Plate.
+
+    With several paths, a workbook that cannot be opened becomes an error
+    entry instead of raising; ``executor`` reads the workbooks in parallel.
+    ``sheet_column`` is the 0-based column holding the sheet name in CSV/TSV files.
+    With ``parse_cache`` the parsed sheets are stored next to each workbook and
+    memory-mapped by later calls instead of parsing the file again.
+    """
+    n = len(paths)
+    if n == 1:
+        workbooks = [read_workbook(paths[0], sheet_column, layout, parse_cache)]
+    elif executor:
+        workbooks = list(executor.map(read_workbook_or_error, paths, [sheet_column] * n, [layout] * n, [parse_cache] * n))
     else:
-        conc = np.nan
+        workbooks = [read_workbook_or_error(path, sheet_column, layout, parse_cache) for path in paths]
+
+    sources, sheet_names, blocks, errors, digests, overrides = [], [], [], [], [], []
+    for path, (names, sheet_blocks, sheet_errors, sheet_digests, metadata) in zip(paths, workbooks):
+        sources.extend([path] * len(names))
+        sheet_names.extend(names)
+        blocks.extend(sheet_blocks)
+        errors.extend(sheet_errors)
+        digests.extend(sheet_digests)
+        overrides.extend(metadata.get(name, {}) for name in names)
+
+    return Plate(sources, sheet_names, *pack_sheets(blocks, layout.replicates), errors, digests, layout.replicates,
+                 [coerced for *_, coerced in blocks], layout.time_unit, overrides)
+
+def load_workbook(path: str, sheet_column: int | None = None, layout: Layout = DEFAULT_LAYOUT) -> Plate:
+    return load_workbooks([path], sheet_column=sheet_column, layout=layout)
+
+# Content hash of a sheet's raw cell block (values and layout, independent of the file around it)
+def hash_block(df):
+    digest = hashlib.sha256(repr(df.shape).encode())
+    digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+# Expand directories, glob patterns and manifest files (one path per line) into workbook paths
+def resolve_inputs(inputs):
+    paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            found = sorted(path for path in glob.glob(os.path.join(item, '*'))
+                           if os.path.splitext(path)[1].lower() in INPUT_EXTENSIONS)
+        elif os.path.splitext(item)[1].lower() in MANIFEST_EXTENSIONS:
+            base = os.path.dirname(item)
+            with open(item, encoding='utf-8') as manifest:
+                lines = [line.strip() for line in manifest]
+            found = [os.path.join(base, line) for line in lines if line and not line.startswith('#')]
+        elif glob.has_magic(item):
+            found = sorted(glob.glob(item, recursive=True))
+        else:
+            found = [item]
+        # Skip Excel lock files left behind by open workbooks
+        paths.extend(path for path in found if not os.path.basename(path).startswith('~$'))
+    return list(dict.fromkeys(paths))
+
+# AUC
+
+# AUC engines: each integrates a (sheets, timepoints) time tensor and a
+# (sheets, timepoints, wells) RLU tensor at once and returns (sheets, wells) areas
+
+def trapezoid_area(time, rlu):
+    dt = np.diff(time, axis=1)[:, :, np.newaxis]
+    return (dt * (rlu[:, 1:] + rlu[:, :-1]) / 2.0).sum(axis=1)
+
+# Composite Simpson's rule for uneven sampling; an odd number of intervals gets the
+# three-point correction of the last interval (as scipy.integrate.simpson)
+def simpson_area(time, rlu):
+    n = time.shape[1]
+    if n < 3:
+        return trapezoid_area(time, rlu)
+    h = np.diff(time, axis=1)[:, :, np.newaxis]
+    m = (n - 1) // 2 * 2
+    h0, h1 = h[:, 0:m:2], h[:, 1:m:2]
+    y0, y1, y2 = rlu[:, 0:m:2], rlu[:, 1:m + 1:2], rlu[:, 2:m + 1:2]
+    area = ((h0 + h1) / 6 * ((2 - h1 / h0) * y0 + (h0 + h1)**2 / (h0 * h1) * y1 + (2 - h0 / h1) * y2)).sum(axis=1)
+    if m < n - 1:
+        h0, h1 = h[:, -2], h[:, -1]
+        area += ((2 * h1**2 + 3 * h0 * h1) / (6 * (h0 + h1)) * rlu[:, -1]
+                 + (h1**2 + 3 * h0 * h1) / (6 * h0) * rlu[:, -2]
+                 - h1**3 / (6 * h0 * (h0 + h1)) * rlu[:, -3])
+    return area
+
+# Area above each well's baseline, the level its signal settles to: the mean of its
+# last BASELINE_POINTS readings
+BASELINE_POINTS = 3
+
+def baseline_area(time, rlu):
+    baseline = rlu[:, -BASELINE_POINTS:].mean(axis=1, keepdims=True)
+    return trapezoid_area(time, rlu - baseline)
+
+# Rise-and-decay kinetics, rlu = offset + amplitude * (exp(-a u) - exp(-b u)) with u the
+# time since the first reading as a fraction of the sheet's time span and a < b rates
+# from a log grid of KINETIC_RATES rates between 0.1 and 100. For every (a, b) pair the offset and amplitude are the closed-form
+# least squares solution, and the pair with the smallest residual wins; the area is that
+# of the fitted curve, span * (offset + amplitude * ((1 - e^-a) / a - (1 - e^-b) / b)).
+# Sheets are processed in blocks so the (sheets, pairs, wells) scores stay bounded
+KINETIC_RATES = 24
+KINETIC_CHUNK = 2_000_000  # scores per block
+
+def kinetic_area(time, rlu):
+    n = time.shape[1]
+    if n < 4:
+        return trapezoid_area(time, rlu)
+    rates = np.logspace(-1, 2, KINETIC_RATES)
+    i, j = np.triu_indices(KINETIC_RATES, 1)
+    a, b = rates[i], rates[j]
+    shape_area = (1 - np.exp(-a)) / a - (1 - np.exp(-b)) / b
+
+    area = np.empty(rlu.shape[::2])
+    block = max(1, KINETIC_CHUNK // (len(a) * max(n, rlu.shape[2])))
+    for start in range(0, len(time), block):
+        k = slice(start, start + block)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            span = time[k, -1:] - time[k, :1]
+            u = ((time[k] - time[k, :1]) / span)[:, np.newaxis, :]
+            basis = np.exp(-a[:, np.newaxis] * u) - np.exp(-b[:, np.newaxis] * u)  # (sheets, pairs, timepoints)
+            basis_mean = basis.mean(axis=2)
+            centered = basis - basis_mean[:, :, np.newaxis]
+            rlu_mean = rlu[k].mean(axis=1)
+            cov = centered @ (rlu[k] - rlu_mean[:, np.newaxis])  # (sheets, pairs, wells)
+            var = (centered**2).sum(axis=2)[:, :, np.newaxis]
+            best = np.argmax(np.nan_to_num(cov**2 / var, nan=-1.0), axis=1)[:, np.newaxis]
+            amplitude = np.take_along_axis(cov / var, best, axis=1)[:, 0]
+            offset = rlu_mean - amplitude * np.take_along_axis(basis_mean, best[:, 0], axis=1)
+            area[k] = span * (offset + amplitude * shape_area[best[:, 0]])
+    return area
 
-    # Uncertainty of concentration
-    if slope != 0:
-        conc_err = np.sqrt(
+# Engines by name; more can be registered here
+AUC_ENGINES = {'trapz': trapezoid_area, 'simpson': simpson_area, 'baseline': baseline_area, 'kinetic': kinetic_area}
+
+# Batched integration along the time axis -> (sheets, levels, replicates). Short sheets
+# are padded with repeated time points, which add no trapezoid area; every other engine
+# gets the sheets grouped by their own number of time points instead
+def integrate_auc(time, rlu, replicates=REPLICATES, engine='trapz'):
+    if engine not in AUC_ENGINES:
+        raise ValueError(f"unknown AUC engine {engine!r}, expected one of: {', '.join(AUC_ENGINES)}")
+    area_of = AUC_ENGINES[engine]
+    lengths = np.argmax(time == time[:, -1:], axis=1) + 1 if time.size else np.full(len(time), time.shape[1])
+    if engine == 'trapz' or (lengths == time.shape[1]).all():
+        auc = area_of(time, rlu)
+    else:
+        auc = np.full(rlu.shape[::2], np.nan)
+        for n in np.unique(lengths[lengths > 1]):
+            group = lengths == n
+            auc[group] = area_of(time[group, :n], rlu[group, :n])
+    return auc.reshape(auc.shape[0], auc.shape[1] // replicates, replicates)
+
+def compute_auc(plate: Plate, engine: str = 'trapz') -> AucResult:
+    replicate_auc = integrate_auc(plate.time, plate.rlu, plate.replicates, engine)
+    return AucResult(replicate_auc, replicate_auc.mean(axis=2), replicate_auc.std(axis=2, ddof=1))
+
+# Outlier screening of the replicate AUCs of every level of every sheet at once. Each
+# test looks at the most extreme replicate of a level and rejects at most that one
+OUTLIER_TESTS = ('grubbs', 'dixon')
+
+# Two-sided critical values of Dixon's r10 (Q) for 3 to 10 replicates (Rorabacher, 1991)
+DIXON_CRITICAL = {
+    0.10: (0.941, 0.765, 0.642, 0.560, 0.507, 0.468, 0.437, 0.412),
+    0.05: (0.970, 0.829, 0.710, 0.625, 0.568, 0.526, 0.493, 0.466),
+    0.01: (0.994, 0.926, 0.821, 0.740, 0.680, 0.634, 0.598, 0.568),
+}
+
+def screen_outliers(replicate_auc, mask, test='grubbs', alpha=0.05) -> np.ndarray:
+    if test not in OUTLIER_TESTS:
+        raise ValueError(f"unknown outlier test {test!r}, expected one of: {', '.join(OUTLIER_TESTS)}")
+    n = replicate_auc.shape[-1]
+    if test == 'dixon' and (alpha not in DIXON_CRITICAL or n > 10):
+        raise ValueError(f"Dixon's Q test needs 3 to 10 replicates and alpha one of: {', '.join(map(str, DIXON_CRITICAL))}")
+    rejected = np.zeros(replicate_auc.shape, dtype=bool)
+    if n < 3:
+        return rejected
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if test == 'grubbs':
+            from scipy.stats import t
+            deviation = np.abs(replicate_auc - replicate_auc.mean(axis=-1, keepdims=True))
+            t_crit = t.ppf(1 - alpha / (2 * n), n - 2)
+            g_crit = (n - 1) / np.sqrt(n) * np.sqrt(t_crit**2 / (n - 2 + t_crit**2))
+            outlier = deviation.max(axis=-1) > g_crit * replicate_auc.std(axis=-1, ddof=1)
+            extreme = deviation.argmax(axis=-1)
+        else:
+            order = np.argsort(replicate_auc, axis=-1)
+            ordered = np.take_along_axis(replicate_auc, order, axis=-1)
+            spread = ordered[..., -1] - ordered[..., 0]
+            q_low = (ordered[..., 1] - ordered[..., 0]) / spread
+            q_high = (ordered[..., -1] - ordered[..., -2]) / spread
+            outlier = np.maximum(q_low, q_high) > DIXON_CRITICAL[alpha][n - 3]
+            extreme = np.where(q_low > q_high, order[..., 0], order[..., -1])
+    np.put_along_axis(rejected, extreme[..., np.newaxis], (outlier & mask)[..., np.newaxis], axis=-1)
+    return rejected
+
+# Mean and SD of each level without its rejected replicates; other levels keep their values
+def reject_outliers(auc: AucResult, mask, test='grubbs', alpha=0.05) -> AucResult:
+    rejected = screen_outliers(auc.replicate_auc, mask, test, alpha)
+    screened = rejected.any(axis=-1)
+    kept = np.where(rejected, np.nan, auc.replicate_auc)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        mean_auc = np.where(screened, np.nanmean(kept, axis=-1), auc.mean_auc)
+        sd_auc = np.where(screened, np.nanstd(kept, axis=-1, ddof=1), auc.sd_auc)
+    return AucResult(auc.replicate_auc, mean_auc, sd_auc, rejected)
+
+# Columns ("G") of the rejected wells of every sheet, as laid out in the workbook
+def rejected_well_names(rejected, layout: Layout) -> list[list[str]]:
+    step = layout.replicates + layout.spacer
+    return [[column_letters(layout.first_column + step * level + replicate) for level, replicate in zip(*np.nonzero(sheet))]
+            for sheet in rejected]
+
+# Standard addition
+
+def _batched_dot(a, b):
+    return (a[..., np.newaxis, :] @ b[..., :, np.newaxis])[..., 0, 0]
+
+# Weights of a weighted fit, 1/SD² normalized to a mean of 1 over each sheet's levels.
+# Sheets with a zero or missing SD cannot be weighted and keep equal weights
+def inverse_variance_weights(sd, mask):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        weights = np.where(mask, 1.0 / sd**2, 0.0)
+        usable = np.where(mask, np.isfinite(weights) & (weights > 0), True).all(axis=-1, keepdims=True)
+        weights = np.where(usable, weights, mask.astype(float))
+        return weights * (mask.sum(axis=-1, keepdims=True) / weights.sum(axis=-1, keepdims=True))
+
+# Batched closed-form regression, ANOVA and standard addition for every sheet.
+# x, y are (..., levels) arrays; mask flags the levels that exist (padding is ignored).
+# weights (normalized to mean 1, see inverse_variance_weights) give a weighted least
+# squares fit with weighted ANOVA and standard errors; without them every level counts once.
+# line = (slope, intercept) replaces the least squares line, e.g. by a robust estimate;
+# the ANOVA and standard errors are then evaluated around that line
+def fit_standard_addition(x, y, mask=None, anova=True, weights=None, line=None) -> FitResult:
+    if mask is None:
+        mask = np.ones(np.shape(x), dtype=bool)
+    x = np.where(mask, x, 0.0)
+    y = np.where(mask, y, 0.0)
+    w = np.where(mask, 1.0 if weights is None else weights, 0.0)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # Linear regression
+        n = mask.sum(axis=-1)
+        x_mean = (w * x).sum(axis=-1) / n
+        y_mean = (w * y).sum(axis=-1) / n
+        dx = np.where(mask, x - x_mean[..., np.newaxis], 0.0)
+        dy = np.where(mask, y - y_mean[..., np.newaxis], 0.0)
+        # Same (biased) covariance products as linregress, so unweighted results match it bit for bit
+        cov_xx = _batched_dot(w * dx, dx) * (1.0 / n)
+        cov_yy = _batched_dot(w * dy, dy) * (1.0 / n)
+        cov_xy = _batched_dot(w * dx, dy) * (1.0 / n)
+        if line is None:
+            slope = cov_xy / cov_xx
+            intercept = y_mean - slope * x_mean
+        else:
+            slope, intercept = np.broadcast_arrays(*line)
+        r = np.where((cov_xx == 0) | (cov_yy == 0), 0.0, np.clip(cov_xy / np.sqrt(cov_xx * cov_yy), -1.0, 1.0))
+        y_fit = slope[..., np.newaxis] * x + intercept[..., np.newaxis]
+
+        # ANOVA
+        ss_reg = np.where(mask, w * (y_fit - y_mean[..., np.newaxis])**2, 0.0).sum(axis=-1)
+        ss_res = np.where(mask, w * (y - y_fit)**2, 0.0).sum(axis=-1)
+        df_reg = 1
+        df_res = n - 2
+        ms_reg = ss_reg / df_reg
+        ms_res = ss_res / df_res
+        F_value = np.where(ms_res != 0, ms_reg / ms_res, np.nan)
+        if anova:
+            from scipy.stats import f
+            p_anova = 1 - f.cdf(F_value, df_reg, df_res)
+        else:
+            p_anova = np.full(np.shape(F_value), np.nan)
+
+        # Standard errors
+        s_yx = np.sqrt(ms_res)
+        s_xx = (w * dx**2).sum(axis=-1)
+        se_slope = s_yx / np.sqrt(s_xx)
+        se_intercept = s_yx * np.sqrt(1/n + x_mean**2 / s_xx)
+
+        # Concentration by standard addition and its uncertainty
+        nonzero = slope != 0
+        conc = np.where(nonzero, -intercept / slope, np.nan)
+        conc_err = np.where(nonzero, np.sqrt(
             (se_intercept / slope)**2 +
             ((intercept * se_slope) / (slope**2))**2
-        )
+        ), np.nan)
+
+    return FitResult(slope, intercept, r, s_yx, se_slope, se_intercept, F_value, p_anova, conc, conc_err)
+
+# Regression on every replicate AUC instead of the level means: the levels and their
+# mask are repeated per replicate and the (..., levels, replicates) tensor is flattened,
+# so the same kernel fits levels * replicates points with levels * replicates - 2
+# residual degrees of freedom. Without rejected wells every level has the same number of
+# points, so the slope and intercept equal those of the mean-based fit
+def fit_replicates(x, replicate_auc, mask=None, anova=True, rejected=None) -> FitResult:
+    replicates = replicate_auc.shape[-1]
+    if mask is None:
+        mask = np.ones(np.shape(x), dtype=bool)
+    points = np.repeat(mask, replicates, axis=-1)
+    if rejected is not None:
+        points = points & ~rejected.reshape(*rejected.shape[:-2], -1)
+    y = replicate_auc.reshape(*replicate_auc.shape[:-2], -1)
+    return fit_standard_addition(np.repeat(x, replicates, axis=-1), y, points, anova)
+
+# Lack-of-fit test of a replicate fit: the residual sum of squares splits into pure
+# error (replicates around their level mean) and lack of fit (level means around the line)
+def lack_of_fit_test(x, replicate_auc, fit: FitResult, mask=None, rejected=None) -> LackOfFit:
+    if mask is None:
+        mask = np.ones(np.shape(x), dtype=bool)
+    kept = mask[..., np.newaxis] if rejected is None else mask[..., np.newaxis] & ~rejected
+    kept = np.broadcast_to(kept, replicate_auc.shape)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        counts = kept.sum(axis=-1)
+        level_mean = np.where(kept, replicate_auc, 0.0).sum(axis=-1) / counts
+        y_fit = fit.slope[..., np.newaxis] * x + fit.intercept[..., np.newaxis]
+        ss_lack = np.where(mask, counts * (level_mean - y_fit)**2, 0.0).sum(axis=-1)
+        ss_pure = np.where(kept, (replicate_auc - level_mean[..., np.newaxis])**2, 0.0).sum(axis=(-2, -1))
+        n = mask.sum(axis=-1)
+        df_lack = n - 2
+        df_pure = counts.sum(axis=-1) - n
+        F_value = np.where(ss_pure != 0, (ss_lack / df_lack) / (ss_pure / df_pure), np.nan)
+        from scipy.stats import f
+        p_value = f.sf(F_value, df_lack, df_pure)
+    return LackOfFit(ss_lack, ss_pure, F_value, p_value)
+
+# Robust lines through the level means. Huber's M-estimator reweights the levels by
+# their scaled residuals (iteratively reweighted least squares through the weighted
+# kernel); Theil-Sen takes the median of the slopes between every pair of levels
+HUBER_C = 1.345
+
+def fit_huber(x, y, mask=None, anova=True, iterations=50) -> FitResult:
+    return fit_standard_addition(x, y, mask, anova, weights=huber_weights(x, y, mask, iterations))
+
+# Final IRLS weights of the Huber fit, normalized to a mean of 1 like inverse_variance_weights
+def huber_weights(x, y, mask=None, iterations=50):
+    if mask is None:
+        mask = np.ones(np.shape(x), dtype=bool)
+    fit = fit_standard_addition(x, y, mask, anova=False)
+    weights = None
+    with np.errstate(divide='ignore', invalid='ignore'), warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        for _ in range(iterations):
+            residuals = np.abs(np.where(mask, y - (fit.slope[..., np.newaxis] * x + fit.intercept[..., np.newaxis]), np.nan))
+            scale = HUBER_C * np.nanmedian(residuals, axis=-1, keepdims=True) / 0.6745
+            weights = np.where(mask & (residuals > scale) & (scale > 0), scale / residuals, mask.astype(float))
+            weights = weights * (mask.sum(axis=-1, keepdims=True) / weights.sum(axis=-1, keepdims=True))
+            refit = fit_standard_addition(x, y, mask, anova=False, weights=weights)
+            converged = (np.allclose(refit.slope, fit.slope, rtol=1e-12, atol=0, equal_nan=True)
+                         and np.allclose(refit.intercept, fit.intercept, rtol=1e-12, atol=0, equal_nan=True))
+            fit = refit
+            if converged:
+                break
+    return weights
+
+def fit_theil_sen(x, y, mask=None, anova=True) -> FitResult:
+    if mask is None:
+        mask = np.ones(np.shape(x), dtype=bool)
+    i, j = np.triu_indices(mask.shape[-1], 1)
+    with np.errstate(divide='ignore', invalid='ignore'), warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        dx = x[..., j] - x[..., i]
+        pairs = np.where(mask[..., i] & mask[..., j] & (dx != 0), (y[..., j] - y[..., i]) / dx, np.nan)
+        slope = np.nanmedian(pairs, axis=-1)
+        intercept = np.nanmedian(np.where(mask, y - slope[..., np.newaxis] * x, np.nan), axis=-1)
+    return fit_standard_addition(x, y, mask, anova, line=(slope, intercept))
+
+# The regression of the level means for each fit method but 'replicates'
+def fit_level_means(x, y, mask=None, fit_method='ols', anova=True, weights=None) -> FitResult:
+    if fit_method == 'huber':
+        return fit_huber(x, y, mask, anova)
+    if fit_method == 'theil-sen':
+        return fit_theil_sen(x, y, mask, anova)
+    return fit_standard_addition(x, y, mask, anova, weights=weights)
+
+# Bootstrap: the replicate AUCs are resampled within each level and every resample of
+# every sheet is refitted by the batched kernel (rejected outliers are never drawn).
+# Resamples are drawn in chunks so the (resamples, sheets, levels, replicates) draws
+# stay within a bounded amount of memory.
+BOOTSTRAP_CHUNK = 2_000_000  # draws per chunk
+
+# One random generator per sheet, seeded by the run seed and the sheet's raw cells, so
+# a sheet's intervals do not depend on the other sheets of the batch or on chunking
+def sheet_generators(result: AnalysisResult, seed=0) -> list:
+    return [np.random.default_rng([seed, int(digest[:16], 16)] if digest else [seed]) for digest in result.plate.digests]
+
+def percentile_interval(samples, level):
+    tail = (1 - level) / 2 * 100
+    # Sheets without a fit only have NaN samples and get a NaN interval
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        return np.nanpercentile(samples, [tail, 100 - tail], axis=0).T
+
+def bootstrap_intervals(result: AnalysisResult, n_resamples=10000, level=0.95, seed=0) -> dict[str, np.ndarray]:
+    rngs = sheet_generators(result, seed)
+    replicate_auc, rejected = result.auc.replicate_auc, result.auc.rejected
+    x, mask = result.plate.concentrations, result.plate.level_mask
+    # Picks index the kept replicates, which are sorted first; a level with a rejected
+    # well resamples only its kept count and the trailing slots are masked out
+    if rejected is None:
+        kept_first, kept = np.arange(replicate_auc.shape[-1]), replicate_auc.shape[-1]
     else:
-        conc_err = np.nan
-
-    # LOD and LOQ (using SE(intercept))
-    LOD = (3.3 * s_yx) / slope if slope != 0 else np.nan
-    LOQ = (10 * s_yx) / slope if slope != 0 else np.nan
-
-    dilution_factor = 20
-
-    # Store summary
-    summary_data.append({
-        'Sheet name': sheet_name,
-        f'[Caffeic acid] ({unit_symbol})': ', '.join([f'{val:.2f}' for val in labels]),
-        'Average AUC': ', '.join([f'{val:.2f}' for val in mean_areas]),
-        'SD (AUC)': ', '.join([f'{val:.2f}' for val in std_areas]),
-        'R': f'{r_value:.3f}',
-        'Slope': f'{slope:.3f}',
-        'Residual standard': f'{s_yx}',
-        'SE(Slope)': f'{se_slope:.2e}',
-        'Intercept': f'{intercept:.3f}',
-        'SE(Intercept)': f'{se_intercept:.2e}',
-        'F value': f'{F_value:.3f}',
-        'Prob > F': f'{p_anova:.3e}',
-    
+        kept_first = np.argsort(rejected, axis=-1, kind='stable')
+        kept = (~rejected).sum(axis=-1, keepdims=True)
+    unused = np.broadcast_to(np.arange(replicate_auc.shape[-1]) >= kept, replicate_auc.shape)
+    kept_count = np.squeeze(kept, axis=-1) if rejected is not None else kept
+    lod_factor = result.constants.get('lod_factor', LOD_FACTOR)
+    volume_correction = result.constants.get('volume_correction', VOLUME_CORRECTION)
+
+    # conc_well is the reported concentration in the well, |conc| / volume_correction
+    samples = {name: np.empty((n_resamples, len(result))) for name in ('conc_well', 'slope', 'lod')}
+    chunk = max(1, BOOTSTRAP_CHUNK // max(1, replicate_auc.size))
+    for start in range(0, n_resamples, chunk):
+        stop = min(start + chunk, n_resamples)
+        size = (stop - start, *replicate_auc.shape)
+        # Each sheet draws for its own levels only; padded levels are masked out of the fit
+        uniform = np.zeros(size)
+        for k, (rng, n) in enumerate(zip(rngs, result.plate.n_levels)):
+            uniform[:, k, :n] = rng.random((stop - start, n, replicate_auc.shape[-1]))
+        picks = np.take_along_axis(np.broadcast_to(kept_first, size), (uniform * kept).astype(int), axis=-1)
+        y = np.take_along_axis(np.broadcast_to(replicate_auc, picks.shape), picks, axis=-1)
+        if result.fit_method == 'replicates':
+            fit = fit_replicates(x, y, mask, anova=False, rejected=np.broadcast_to(unused, size))
+        else:
+            y_mean = np.where(unused, 0.0, y).sum(axis=-1) / kept_count
+            fit = fit_level_means(x, y_mean, mask, result.fit_method, anova=False, weights=result.weights)
+        samples['conc_well'][start:stop] = np.abs(fit.conc) / volume_correction
+        samples['slope'][start:stop] = fit.slope
+        samples['lod'][start:stop] = detection_limit(fit.s_yx, fit.slope, lod_factor)
+    return {name: percentile_interval(values, level) for name, values in samples.items()}
+
+# Monte Carlo propagation through the concentration, the volume correction, the dilution
+# factor and LOD/LOQ. 'covariance' draws (slope, intercept) from the fitted bivariate
+# normal, cov(slope, intercept) = -x_mean * se_slope**2 with x_mean weighted like the
+# fit's points, and the residual SD from its scaled chi distribution. 'replicates'
+# perturbs each level's mean AUC with its replicate noise (SD / sqrt(replicates),
+# equivalent to perturbing the RLU as the AUC is linear in it) and refits; for a fit on
+# the replicate AUCs it draws every kept replicate as the level mean plus that SD.
+# Sheets are processed in blocks so the draws and their percentiles stay within a
+# bounded amount of memory.
+MONTE_CARLO_MODES = ('covariance', 'replicates')
+
+def monte_carlo_intervals(result: AnalysisResult, n_draws=100000, level=0.95, seed=0, mode='covariance') -> dict[str, np.ndarray]:
+    if mode not in MONTE_CARLO_MODES:
+        raise ValueError(f"unknown Monte Carlo mode {mode!r}, expected one of: {', '.join(MONTE_CARLO_MODES)}")
+    rngs = sheet_generators(result, seed)
+    plate, auc, fit = result.plate, result.auc, result.fit
+    n_sheets = len(result)
+    constants = {name: np.broadcast_to(np.asarray(result.constants.get(name, default), dtype=float), (n_sheets,))
+                 for name, default in DEFAULT_CONSTANTS.items()}
+    mask = plate.level_mask
+    on_replicates = result.fit_method == 'replicates'
+    # Weight of each level among the fitted points: its kept replicates for a replicate
+    # fit, else the fit's weights (WLS, Huber) or 1
+    if on_replicates:
+        weights = np.where(mask, plate.replicates - (0 if auc.rejected is None else auc.rejected.sum(axis=-1)), 0)
+    else:
+        weights = np.where(mask, 1.0 if result.weights is None else result.weights, 0.0)
+    points = weights.sum(axis=-1) if on_replicates else mask.sum(axis=-1)
+    with np.errstate(invalid='ignore'):
+        x_mean = np.where(mask, weights * plate.concentrations, 0.0).sum(axis=-1) / weights.sum(axis=-1)
+
+    intervals = {name: np.full((n_sheets, 2), np.nan) for name in ('conc_well', 'conc_sample', 'lod', 'loq')}
+    width = n_draws * (auc.replicate_auc[0].size if on_replicates else mask.shape[1]) if mode == 'replicates' else n_draws
+    block = max(1, BOOTSTRAP_CHUNK // max(1, width))
+    for start in range(0, n_sheets, block):
+        k = slice(start, min(start + block, n_sheets))
+        size = (n_draws, k.stop - k.start)
+        sheets = range(k.start, k.stop)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            if mode == 'covariance':
+                z_slope, z_intercept = np.stack([rngs[j].standard_normal((2, n_draws)) for j in sheets], axis=-1)
+                coupling = -x_mean[k] * fit.se_slope[k]  # cov(slope, intercept) / se_slope
+                slope = fit.slope[k] + fit.se_slope[k] * z_slope
+                intercept = (fit.intercept[k] + coupling * z_slope
+                             + np.sqrt(np.maximum(fit.se_intercept[k]**2 - coupling**2, 0.0)) * z_intercept)
+                df_res = np.maximum(points[k] - 2, 1)
+                chi2 = np.stack([rngs[j].chisquare(df, n_draws) for j, df in zip(sheets, df_res)], axis=-1)
+                s_yx = fit.s_yx[k] * np.sqrt(chi2 / df_res)
+            elif on_replicates:
+                noise = np.zeros((*size, *auc.replicate_auc.shape[1:]))
+                for i, j in enumerate(sheets):
+                    noise[:, i, :plate.n_levels[j]] = rngs[j].standard_normal((n_draws, plate.n_levels[j], plate.replicates))
+                y = auc.mean_auc[k, :, np.newaxis] + auc.sd_auc[k, :, np.newaxis] * noise
+                draws = fit_replicates(plate.concentrations[k], y, mask[k], anova=False,
+                                       rejected=None if auc.rejected is None else auc.rejected[k])
+                slope, intercept, s_yx = draws.slope, draws.intercept, draws.s_yx
+            else:
+                noise = np.zeros((*size, mask.shape[1]))
+                for i, j in enumerate(sheets):
+                    noise[:, i, :plate.n_levels[j]] = rngs[j].standard_normal((n_draws, plate.n_levels[j]))
+                kept = plate.replicates - (0 if auc.rejected is None else auc.rejected[k].sum(axis=-1))
+                y = auc.mean_auc[k] + auc.sd_auc[k] / np.sqrt(kept) * noise
+                draws = fit_level_means(plate.concentrations[k], y, mask[k], result.fit_method, anova=False,
+                                        weights=None if result.weights is None else result.weights[k])
+                slope, intercept, s_yx = draws.slope, draws.intercept, draws.s_yx
+            conc_well = np.abs(np.where(slope != 0, -intercept / slope, np.nan)) / constants['volume_correction'][k]
+        samples = {
+            'conc_well': conc_well,
+            'conc_sample': conc_well * constants['dilution_factor'][k],
+            'lod': detection_limit(s_yx, slope, constants['lod_factor'][k]),
+            'loq': detection_limit(s_yx, slope, constants['loq_factor'][k]),
+        }
+        for name, values in samples.items():
+            intervals[name][k] = percentile_interval(values, level)
+    return intervals
+
+# LOD and LOQ (using the residual standard deviation)
+def detection_limit(s_yx, slope, factor):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(slope != 0, (factor * s_yx) / slope, np.nan)
+
+def compute_detection_limits(fit: FitResult, lod_factor=LOD_FACTOR, loq_factor=LOQ_FACTOR) -> DetectionLimits:
+    return DetectionLimits(detection_limit(fit.s_yx, fit.slope, lod_factor), detection_limit(fit.s_yx, fit.slope, loq_factor))
+
+# Per-sheet assay constants: the defaults, then ``constants`` for the whole run, then the
+# ``metadata`` table (by sheet name), then each workbook's own metadata sheet
+def resolve_constants(plate: Plate, constants=None, metadata=None) -> dict[str, np.ndarray]:
+    run = {**DEFAULT_CONSTANTS, **{name: value for name, value in (constants or {}).items() if value is not None}}
+    resolved = {name: np.full(len(plate.sheet_names), float(value)) for name, value in run.items()}
+    for k, sheet_name in enumerate(plate.sheet_names):
+        sheet_overrides = {**(metadata or {}).get(sheet_name, {}), **(plate.overrides[k] if plate.overrides else {})}
+        for name, value in sheet_overrides.items():
+            resolved[name][k] = value
+    return resolved
+
+# 'ols' weighs every level equally; 'wls' weighs each level by 1/SD² of its replicate AUCs;
+# 'replicates' fits every replicate AUC and adds a lack-of-fit test; 'huber' and
+# 'theil-sen' are robust lines through the level means
+FIT_METHODS = ('ols', 'wls', 'replicates', 'huber', 'theil-sen')
+
+def analyze(paths: str | list[str], unit: str = 'micromolar', executor=None, sheet_column: int | None = None,
+            layout: Layout = DEFAULT_LAYOUT, parse_cache: bool = False, constants: dict[str, float] | None = None,
+            metadata: dict[str, dict[str, float]] | None = None, fit_method: str = 'ols',
+            outlier_test: str | None = None, outlier_alpha: float = 0.05, auc_engine: str = 'trapz') -> AnalysisResult:
+    """Load, integrate and fit every sheet of the given workbooks in one batch.
+
+    ``constants`` sets dilution_factor, volume_correction, lod_factor and
+    loq_factor for the run; ``metadata`` (see read_metadata) and metadata
+    sheets inside the workbooks override them per sheet. ``fit_method`` is
+    one of FIT_METHODS; ``outlier_test`` (one of OUTLIER_TESTS) leaves the
+    replicates it rejects at level ``outlier_alpha`` out of the fit.
+    ``auc_engine`` is one of AUC_ENGINES.
+    """
+    if fit_method not in FIT_METHODS:
+        raise ValueError(f"unknown fit method {fit_method!r}, expected one of: {', '.join(FIT_METHODS)}")
+    if auc_engine not in AUC_ENGINES:
+        raise ValueError(f"unknown AUC engine {auc_engine!r}, expected one of: {', '.join(AUC_ENGINES)}")
+    plate = load_workbooks([paths] if isinstance(paths, str) else list(paths), executor, sheet_column, layout, parse_cache)
+    auc = compute_auc(plate, auc_engine)
+    if outlier_test:
+        auc = reject_outliers(auc, plate.level_mask, outlier_test, outlier_alpha)
+    weights = None
+    if fit_method == 'wls':
+        weights = inverse_variance_weights(auc.sd_auc, plate.level_mask)
+    elif fit_method == 'huber':
+        weights = huber_weights(plate.concentrations, auc.mean_auc, plate.level_mask)
+    lack_of_fit = None
+    if fit_method == 'replicates':
+        fit = fit_replicates(plate.concentrations, auc.replicate_auc, plate.level_mask, rejected=auc.rejected)
+        lack_of_fit = lack_of_fit_test(plate.concentrations, auc.replicate_auc, fit, plate.level_mask, auc.rejected)
+    else:
+        fit = fit_level_means(plate.concentrations, auc.mean_auc, plate.level_mask,
+                              'wls' if weights is not None else fit_method, weights=weights)
+    sheet_constants = resolve_constants(plate, constants, metadata)
+    limits = compute_detection_limits(fit, sheet_constants['lod_factor'], sheet_constants['loq_factor'])
+    return AnalysisResult(plate, auc, fit, limits, unit_map.get(unit, unit), sheet_constants,
+                          fit_method=fit_method, weights=weights, lack_of_fit=lack_of_fit, outlier_test=outlier_test,
+                          rejected_wells=[] if auc.rejected is None else rejected_well_names(auc.rejected, layout),
+                          auc_engine=auc_engine)
+
+# Rendering
+
+# Object-oriented Agg renderer: the Figure/Axes template and its artists are built
+# once per process and only their data is swapped for each sheet. It never touches
+# pyplot, so no interactive backend is probed and it is safe in worker processes.
+class PlotRenderer:
+    def __init__(self):
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+        self.figure = Figure(figsize=(8, 5))
+        FigureCanvasAgg(self.figure)
+        self.ax = self.figure.add_subplot()
+        self.points, (self.lower_cap, self.upper_cap), (self.bars,) = self.ax.errorbar(
+            [0], [0], yerr=[0], fmt='o', capsize=5, markersize=8, color='royalblue')
+        (self.fit_line,) = self.ax.plot([0], [0], color='red', linestyle='--', label='Linear regression')
+        self.ax.set_ylabel('AUC (RLU)')
+        self.ax.grid(axis='y', linestyle='--', alpha=0.6)
+        self.legend = self.ax.legend()
+        # tight_layout only depends on the tick label widths, so its result is reused
+        self.layouts = {}
+
+    def render(self, filename, sheet_name, unit_symbol, x, y, y_err, slope, intercept, r_value, time_unit=None):
+        y_fit = slope * x + intercept
+        self.points.set_data(x, y)
+        self.lower_cap.set_data(x, y - y_err)
+        self.upper_cap.set_data(x, y + y_err)
+        self.bars.set_segments([[(xi, lo), (xi, hi)] for xi, lo, hi in zip(x, y - y_err, y + y_err)])
+        self.fit_line.set_data(x, y_fit)
+        self.legend.get_texts()[0].set_text(f'Linear regression (r={r_value:.4f})')
+        self.ax.set_xlabel(f'[Caffeic acid] samples ({unit_symbol})')
+        self.ax.set_ylabel(f'AUC (RLU·{time_unit})' if time_unit else 'AUC (RLU)')
+        self.ax.set_title(f'Average RLU (± SD) — {sheet_name}')
+
+        self.ax.relim()
+        self.ax.set_autoscale_on(True)
+        self.ax.autoscale_view()
+        self.ax.set_ylim(bottom=0)
+
+        layout_key = (unit_symbol, time_unit) + tuple(
+            tuple(len(label) for label in axis.major.formatter.format_ticks(axis.get_majorticklocs()))
+            for axis in (self.ax.xaxis, self.ax.yaxis))
+        if layout_key in self.layouts:
+            self.figure.subplots_adjust(**self.layouts[layout_key])
+        else:
+            self.figure.tight_layout()
+            params = self.figure.subplotpars
+            self.layouts[layout_key] = {side: getattr(params, side) for side in ('left', 'right', 'bottom', 'top')}
+        self.figure.savefig(filename, dpi=300)
+
+_renderer = None
+
+# Plot one standard-addition curve; matplotlib is only imported once a plot is drawn
+def render_plot(filename, sheet_name, unit_symbol, x, y, y_err, slope, intercept, r_value, time_unit=None):
+    global _renderer
+    if _renderer is None:
+        _renderer = PlotRenderer()
+    _renderer.render(filename, sheet_name, unit_symbol, x, y, y_err, slope, intercept, r_value, time_unit)
+
+def render_sheet(sheet: SheetResult, filename: str):
+    render_plot(filename, sheet.sheet_name, sheet.unit_symbol, sheet.concentrations, sheet.mean_auc, sheet.sd_auc,
+                sheet.slope, sheet.intercept, sheet.r, sheet.time_unit)
+
+# Each workbook gets its own graph folder in batch mode so sheet names cannot collide
+# One plot folder per source file: its stem, plus the extension for .csv/.tsv exports and
+# a hash of the path when files in different folders share a name, so none overwrite another
+def plot_folders(sources) -> dict[str, str]:
+    names = {}
+    for source in dict.fromkeys(sources):
+        stem, ext = os.path.splitext(os.path.basename(source))
+        names[source] = stem if ext.lower() == '.xlsx' else f"{stem}_{ext[1:].lower()}"
+    taken = list(names.values())
+    return {source: name if taken.count(name) == 1 else f"{name}-{hashlib.sha1(os.path.abspath(source).encode()).hexdigest()[:8]}"
+            for source, name in names.items()}
+
+def plot_filename(output_folder, sheet_name, source=None, folders=None):
+    if source is not None:
+        folder = (folders or {}).get(source) or plot_folders([source])[source]
+        output_folder = os.path.join(output_folder, folder)
+    return os.path.join(output_folder, f"{sheet_name.replace('/', '_')}.png")
+
+# Summary and export
+
+AUC_ENGINE_LABELS = {'simpson': 'Simpson', 'baseline': 'Trapezoid above baseline', 'kinetic': 'Rise-decay fit'}
+FIT_LABELS = {'wls': 'WLS', 'replicates': 'Replicates', 'huber': 'Huber', 'theil-sen': 'Theil-Sen'}
+INTERVAL_LABELS = {'conc_well': 'Concentration', 'conc_sample': 'Sample concentration', 'slope': 'Slope', 'lod': 'LOD', 'loq': 'LOQ'}
+
+def format_summary_row(sheet: SheetResult) -> dict:
+    unit_symbol = sheet.unit_symbol
+    dilution_factor, volume = sheet.dilution_factor, sheet.volume_correction
+    conc, conc_err, LOD, LOQ = sheet.conc, sheet.conc_err, sheet.LOD, sheet.LOQ
+
+    return {
+        'Sheet name': sheet.sheet_name,
+        f'[Caffeic acid] ({unit_symbol})': ', '.join([f'{val:.2f}' for val in sheet.concentrations]),
+        'Average AUC': ', '.join([f'{val:.2f}' for val in sheet.mean_auc]),
+        'SD (AUC)': ', '.join([f'{val:.2f}' for val in sheet.sd_auc]),
+        'R': f'{sheet.r:.3f}',
+        'Slope': f'{sheet.slope:.3f}',
+        'Residual standard': f'{sheet.s_yx}',
+        'SE(Slope)': f'{sheet.se_slope:.2e}',
+        'Intercept': f'{sheet.intercept:.3f}',
+        'SE(Intercept)': f'{sheet.se_intercept:.2e}',
+        'F value': f'{sheet.F:.3f}',
+        'Prob > F': f'{sheet.p:.3e}',
+
+        # constantes do ensaio (podem variar por folha)
+        'Volume correction': f'{volume:g}',
+        'LOD factor': f'{sheet.lod_factor:g}',
+        'LOQ factor': f'{sheet.loq_factor:g}',
+        'Dilution factor': f'{dilution_factor:g}',
+
         # valores no poço
-        'Concentration (± error)': f'{(abs(conc) / 0.99):.3f} ± {(conc_err / 0.99):.3f}',
+        'Concentration (± error)': f'{(abs(conc) / volume):.3f} ± {(conc_err / volume):.3f}',
         'LOD': f'{LOD:.3f}',
         'LOQ': f'{LOQ:.3f}',
 
         # valores corrigidos para a amostra original
-        'Concentration ×20 (± error)': f'{(abs(conc) / 0.99 * dilution_factor):.3f} ± {(conc_err / 0.99 * dilution_factor):.3f}',
-        'LOD ×20': f'{LOD * dilution_factor:.3f}',
-        'LOQ ×20': f'{LOQ * dilution_factor:.3f}'
+        'Sample concentration (± error)': f'{(abs(conc) / volume * dilution_factor):.3f} ± {(conc_err / volume * dilution_factor):.3f}',
+        'Sample LOD': f'{LOD * dilution_factor:.3f}',
+        'Sample LOQ': f'{LOQ * dilution_factor:.3f}',
+
+        # método de integração e de ajuste, quando não são os padrões
+        **({'AUC engine': AUC_ENGINE_LABELS.get(sheet.auc_engine, sheet.auc_engine)} if sheet.auc_engine != 'trapz' else {}),
+        **({'Fit': FIT_LABELS.get(sheet.fit_method, sheet.fit_method)} if sheet.fit_method != 'ols' else {}),
+        **({'Lack of fit F': f'{sheet.lack_of_fit_F:.3f}', 'Lack of fit Prob > F': f'{sheet.lack_of_fit_p:.3e}'}
+           if sheet.fit_method == 'replicates' else {}),
+        **({'Rejected wells': ', '.join(sheet.rejected_wells) or '-'} if sheet.outlier_test else {}),
+
+        # intervalos de confiança (bootstrap / Monte Carlo), quando calculados
+        **{f'{INTERVAL_LABELS.get(name, name)} {sheet.ci_level * 100:g}% CI': f'{low:.3f} – {high:.3f}'
+           for name, (low, high) in sheet.intervals.items()},
+    }
+
+# Plot and summarize one sheet; runs in a worker process when --jobs > 1.
+# filename is None when plots are disabled
+def process_sheet(task):
+    sheet, filename = task
+    if sheet.error:
+        return {'Sheet name': sheet.sheet_name, 'Error': sheet.error}
+    try:
+        if filename:
+            render_sheet(sheet, filename)
+        return format_summary_row(sheet)
+    except Exception as exc:
+        return {'Sheet name': sheet.sheet_name, 'Error': f'{type(exc).__name__}: {exc}'}
+
+# When every sheet uses the default constants the summary keeps its original layout:
+# no constant columns and the sample values headed 'Concentration ×20 (± error)',
+# 'LOD ×20' and 'LOQ ×20', so readers keyed on those headers keep working
+SUMMARY_CONSTANTS = {'Volume correction': VOLUME_CORRECTION, 'LOD factor': LOD_FACTOR,
+                     'LOQ factor': LOQ_FACTOR, 'Dilution factor': DILUTION_FACTOR}
+LEGACY_SAMPLE_HEADERS = {
+    'Sample concentration (± error)': f'Concentration ×{DILUTION_FACTOR:g} (± error)',
+    'Sample LOD': f'LOD ×{DILUTION_FACTOR:g}',
+    'Sample LOQ': f'LOQ ×{DILUTION_FACTOR:g}',
+}
+
+def summary_frame(rows) -> pd.DataFrame:
+    summary = pd.DataFrame(rows)
+    defaults = all(summary[column].dropna().eq(f'{value:g}').all()
+                   for column, value in SUMMARY_CONSTANTS.items() if column in summary)
+    if defaults:
+        summary = summary.drop(columns=list(SUMMARY_CONSTANTS), errors='ignore').rename(columns=LEGACY_SAMPLE_HEADERS)
+    return summary
+
+# Typed, columnar results: one row per sheet, full-precision floats and list
+# columns for the per-level values
+RESULT_FORMATS = {'excel': '.xlsx', 'parquet': '.parquet', 'arrow': '.arrow'}
+
+def _has_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+# Post-fit stage: every column that only depends on the fit and the assay constants,
+# vectorized over sheets. The constants may be scalars or one value per sheet, so it
+# also recomputes a stored results table (see the 'reanalyze' command)
+def derived_columns(slope, s_yx, conc, conc_err, dilution_factor=DILUTION_FACTOR, volume_correction=VOLUME_CORRECTION,
+                    lod_factor=LOD_FACTOR, loq_factor=LOQ_FACTOR) -> dict[str, np.ndarray]:
+    lod = detection_limit(s_yx, slope, lod_factor)
+    loq = detection_limit(s_yx, slope, loq_factor)
+    with np.errstate(invalid='ignore'):
+        conc_well = np.abs(conc) / volume_correction
+        conc_well_err = conc_err / volume_correction
+    columns = {
+        'lod': lod,
+        'loq': loq,
+        'lod_factor': lod_factor,
+        'loq_factor': loq_factor,
+        'volume_correction': volume_correction,
+        'dilution_factor': dilution_factor,
+        'conc_well': conc_well,
+        'conc_well_err': conc_well_err,
+        'conc_sample': conc_well * dilution_factor,
+        'conc_sample_err': conc_well_err * dilution_factor,
+        'lod_sample': lod * dilution_factor,
+        'loq_sample': loq * dilution_factor,
+    }
+    shape = np.broadcast_shapes(*(np.shape(value) for value in columns.values()))
+    return {name: np.broadcast_to(np.asarray(value, dtype=float), shape).copy() for name, value in columns.items()}
+
+# Parameter sweep: the derived columns for each value of one constant, as one
+# broadcast (values, sheets) evaluation of the post-fit stage
+def sweep_constants(result: AnalysisResult, name: str, values) -> pd.DataFrame:
+    if name not in DEFAULT_CONSTANTS:
+        raise ValueError(f"unknown constant {name!r}, expected one of: {', '.join(DEFAULT_CONSTANTS)}")
+    values = np.asarray(values, dtype=float)[:, np.newaxis]
+    fit = result.fit
+    derived = derived_columns(fit.slope, fit.s_yx, fit.conc, fit.conc_err, **{**result.constants, name: values})
+    return pd.DataFrame({
+        'source_file': pd.array(np.tile(result.plate.sources, len(values)), dtype='string'),
+        'sheet_name': pd.array(np.tile(result.plate.sheet_names, len(values)), dtype='string'),
+        **{column: value.ravel() for column, value in derived.items()},
     })
 
-# Save table
-path_save = 'Results'
-os.makedirs(path_save, exist_ok=True)
-summary_df = pd.DataFrame(summary_data)
-summary_file = os.path.join(path_save, 'summary_results.xlsx')
-summary_df.to_excel(summary_file, index=False)
+def build_results_table(result: AnalysisResult, errors: list[str | None]) -> pd.DataFrame:
+    plate, auc, fit = result.plate, result.auc, result.fit
+    n_sheets = len(result)
+    return pd.DataFrame({
+        'source_file': pd.array(plate.sources, dtype='string'),
+        'sheet_name': pd.array(plate.sheet_names, dtype='string'),
+        'unit': pd.array([result.unit_symbol] * n_sheets, dtype='string'),
+        'time_unit': pd.array([plate.time_unit] * n_sheets, dtype='string'),
+        'auc_engine': pd.array([result.auc_engine] * n_sheets, dtype='string'),
+        'concentrations': [plate.concentrations[k, :n].tolist() for k, n in enumerate(plate.n_levels)],
+        'mean_auc': [auc.mean_auc[k, :n].tolist() for k, n in enumerate(plate.n_levels)],
+        'sd_auc': [auc.sd_auc[k, :n].tolist() for k, n in enumerate(plate.n_levels)],
+        'n_levels': plate.n_levels.astype('int64'),
+        'fit_method': pd.array([result.fit_method] * n_sheets, dtype='string'),
+        'r': fit.r,
+        'slope': fit.slope,
+        'se_slope': fit.se_slope,
+        'intercept': fit.intercept,
+        'se_intercept': fit.se_intercept,
+        'residual_sd': fit.s_yx,
+        'f_value': fit.F,
+        'prob_f': fit.p,
+        'lack_of_fit_f': np.full(n_sheets, np.nan) if result.lack_of_fit is None else result.lack_of_fit.F,
+        'lack_of_fit_p': np.full(n_sheets, np.nan) if result.lack_of_fit is None else result.lack_of_fit.p,
+        'conc': fit.conc,
+        'conc_err': fit.conc_err,
+        **derived_columns(fit.slope, fit.s_yx, fit.conc, fit.conc_err, **result.constants),
+        # Every interval column is always written (NaN when not computed), so the part
+        # files of a --store dataset share one schema
+        'ci_level': np.full(n_sheets, np.nan if result.ci_level is None else result.ci_level),
+        **{f'{name}_ci_{side}': result.intervals.get(name, np.full((n_sheets, 2), np.nan))[:, i]
+           for name in INTERVAL_LABELS for i, side in enumerate(('low', 'high'))},
+        'outlier_test': pd.array([result.outlier_test] * n_sheets, dtype='string'),
+        'rejected_wells': result.rejected_wells or [[] for _ in range(n_sheets)],
+        'coerced_cells': np.array([len(cells) for cells in plate.coerced], dtype='int64'),
+        'error': pd.array(errors, dtype='string'),
+    })
+
+# Arrow types of the list columns. Inferred from the values, a column whose lists are all
+# empty would become list<null> and clash with the part files of a --store that have values
+LIST_COLUMN_TYPES = {'concentrations': 'float64', 'mean_auc': 'float64', 'sd_auc': 'float64', 'rejected_wells': 'string'}
+
+def _arrow_table(results):
+    import pyarrow as pa
+    table = pa.Table.from_pandas(results, preserve_index=False)
+    for name, value_type in LIST_COLUMN_TYPES.items():
+        if name in table.column_names:
+            i = table.column_names.index(name)
+            values = pa.array(results[name].tolist(), type=pa.list_(pa.type_for_alias(value_type)))
+            table = table.set_column(i, name, values)
+    return table
 
-print(f"\n✅ Summary table saved as: {summary_file}")
-print(f"📊 Graphs saved in folder: '{output_folder}'")
-print("🎯 Done! Includes concentration, uncertainty, LOD, LOQ, and corrected naming.")
+def write_results(results, path):
+    if path.endswith('.parquet'):
+        import pyarrow.parquet as pq
+        pq.write_table(_arrow_table(results), path)
+    else:
+        import pyarrow.feather as feather
+        feather.write_feather(_arrow_table(results), path)
+
+def read_results(path):
+    if os.path.isdir(path):
+        # The part files of a store are read with their unified schema, so older parts
+        # with fewer columns or all-empty (null) columns still combine with newer ones
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+        parts = ds.dataset(path, format='parquet')
+        schema = pa.unify_schemas([part.physical_schema for part in parts.get_fragments()], promote_options='permissive')
+        return ds.dataset(path, schema=schema, format='parquet').to_table().to_pandas()
+    if path.endswith('.parquet'):
+        return pd.read_parquet(path)
+    return pd.read_feather(path)
+
+# Append one run to a Parquet dataset folder as a new part file, tagged with its run id
+def append_to_store(results, store):
+    os.makedirs(store, exist_ok=True)
+    run_id = f"{datetime.now(timezone.utc):%Y%m%dT%H%M%S%fZ}-{os.getpid()}"
+    path = os.path.join(store, f'run-{run_id}.parquet')
+    write_results(results.assign(run_id=pd.array([run_id] * len(results), dtype='string')), path)
+    return path
+
+def export_results(result: AnalysisResult, path: str):
+    """Write a result as a formatted .xlsx summary or a typed .parquet/.arrow table."""
+    if path.endswith('.xlsx'):
+        summary_frame([process_sheet((sheet, None)) for sheet in result.sheets()]).to_excel(path, index=False)
+    else:
+        write_results(result.to_frame(), path)
+
+# Result cache: one summary row (.json) and one plot (.png) per content-addressed key
+CACHE_VERSION = 1
+
+def cache_key(digest, sheet_name, options):
+    payload = json.dumps({'version': CACHE_VERSION, 'block': digest, 'sheet': sheet_name, **options}, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+def cache_lookup(cache_dir, key, filename):
+    row_path = os.path.join(cache_dir, f'{key}.json')
+    plot_path = os.path.join(cache_dir, f'{key}.png')
+    try:
+        with open(row_path, encoding='utf-8') as handle:
+            row = json.load(handle)
+        if filename:
+            shutil.copyfile(plot_path, filename)
+    except (OSError, ValueError):
+        return None
+    # Refresh the timestamps so eviction drops the least recently used entries first
+    for path in (row_path, plot_path) if filename else (row_path,):
+        os.utime(path)
+    return row
+
+# filename is None for --no-plots runs, which only cache the summary row
+def cache_store(cache_dir, key, row, filename):
+    os.makedirs(cache_dir, exist_ok=True)
+    if filename:
+        shutil.copyfile(filename, os.path.join(cache_dir, f'{key}.png'))
+    with open(os.path.join(cache_dir, f'{key}.json'), 'w', encoding='utf-8') as handle:
+        json.dump(row, handle, ensure_ascii=False)
+
+def cache_evict(cache_dir, max_bytes):
+    try:
+        entries = [entry for entry in os.scandir(cache_dir) if entry.is_file()]
+    except FileNotFoundError:
+        return
+    entries.sort(key=lambda entry: entry.stat().st_mtime)
+    total = sum(entry.stat().st_size for entry in entries)
+    for entry in entries:
+        if total <= max_bytes:
+            break
+        total -= entry.stat().st_size
+        os.remove(entry.path)
+
+# Command line
+
+def add_layout_arguments(parser):
+    group = parser.add_argument_group("sheet layout", "0-based rows and columns; each option overrides the default and the --layout file")
+    group.add_argument("--layout", help=f"JSON file with any of the fields: {', '.join(Layout.__dataclass_fields__)}")
+    group.add_argument("--first-row", type=int, help=f"Row of the first time point (default: {FIRST_ROW})")
+    group.add_argument("--last-row", type=int, help=f"Row after the last time point, -1 to read to the end of the sheet (default: {LAST_ROW})")
+    group.add_argument("--time-column", type=int, help="Column holding the time points (default: 0)")
+    group.add_argument("--label-row", type=int, help="Row holding the concentration of each replicate group (default: 0)")
+    group.add_argument("--first-column", type=int, help="Column of the first replicate well (default: 1)")
+    group.add_argument("--replicates", type=int, help=f"Replicate wells per concentration (default: {REPLICATES})")
+    group.add_argument("--spacer", type=int, help="Empty columns between replicate groups (default: 1)")
+    group.add_argument("--time-unit", choices=list(TIME_UNITS), help=f"Unit the time points are converted to, and assumed for bare numbers when the time header names none; AUCs are in RLU·unit (default: {TIME_UNIT})")
+
+def layout_from_args(parser, args) -> Layout:
+    overrides = {name: getattr(args, name) for name in Layout.__dataclass_fields__ if getattr(args, name) is not None}
+    if overrides.get('last_row') == -1:
+        overrides['last_row'] = None
+    try:
+        return replace(Layout.from_json(args.layout) if args.layout else DEFAULT_LAYOUT, **overrides)
+    except (OSError, TypeError, ValueError) as exc:
+        parser.error(f"invalid layout: {exc}")
+
+def add_constant_arguments(parser):
+    group = parser.add_argument_group("assay constants", "A metadata sheet in the workbook or a --metadata table overrides them per sheet")
+    group.add_argument("--config", help=f"JSON file with any of: {', '.join(DEFAULT_CONSTANTS)}; the options below override it")
+    group.add_argument("--dilution-factor", type=float, help=f"Dilution factor of the original sample (default: {DILUTION_FACTOR})")
+    group.add_argument("--volume-correction", type=float, help=f"Well volume correction the concentrations are divided by (default: {VOLUME_CORRECTION})")
+    group.add_argument("--lod-factor", type=float, help=f"LOD multiplier of the residual SD over the slope (default: {LOD_FACTOR})")
+    group.add_argument("--loq-factor", type=float, help=f"LOQ multiplier of the residual SD over the slope (default: {LOQ_FACTOR})")
+    group.add_argument("--metadata", help="Table (.xlsx, .csv or .tsv) with a 'sheet' column and a column per constant to override")
+
+def constants_from_args(parser, args):
+    try:
+        constants = {}
+        if args.config:
+            with open(args.config, encoding='utf-8') as handle:
+                constants = json.load(handle)
+            unknown = set(constants) - set(DEFAULT_CONSTANTS)
+            if unknown:
+                raise ValueError(f"unknown constant(s) in {args.config}: {', '.join(sorted(unknown))}")
+        metadata = read_metadata(args.metadata) if args.metadata else None
+    except (OSError, ValueError) as exc:
+        parser.error(f"invalid assay constants: {exc}")
+    constants.update({name: getattr(args, name) for name in DEFAULT_CONSTANTS if getattr(args, name) is not None})
+    return constants, metadata
+
+def _parse_sweep(text):
+    name, _, values = text.partition('=')
+    name = name.strip().replace('-', '_')
+    try:
+        if name not in DEFAULT_CONSTANTS:
+            raise ValueError
+        return name, [float(value) for value in values.split(',')]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected NAME=V1,V2,... with NAME one of: {', '.join(DEFAULT_CONSTANTS)}")
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] == 'plot':
+        return plot_main(argv[1:])
+    if argv and argv[0] == 'watch':
+        return watch_main(argv[1:])
+    if argv and argv[0] == 'reanalyze':
+        return reanalyze_main(argv[1:])
+
+    # 1️⃣ Parser
+    parser = argparse.ArgumentParser(description="Process Excel data and plot AUC with regression and ANOVA analysis")
+    parser.add_argument("-i", "--input", required=True, nargs='+', help="Input file(s): .xlsx workbooks or .csv/.tsv exports, directories, glob patterns or manifest files (.txt/.lst, one path per line)")
+    parser.add_argument("-u", "--unit", choices=["micromolar", "millimolar"], default="micromolar", help="Unit for caffeic acid concentration (micromolar or millimolar)")
+    parser.add_argument("--sheet-column", type=int, help="CSV/TSV only: 0-based column holding the sheet name of each row (default: one sheet per file)")
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="Number of worker processes used to read workbooks and plot and summarize sheets (default: 1)")
+    parser.add_argument("--cache-dir", default=os.path.join('Results', '.cache'), help="Folder of the result cache (default: Results/.cache)")
+    parser.add_argument("--cache-size", type=float, default=500, help="Maximum size of the result cache in MB (default: 500)")
+    parser.add_argument("--no-cache", action="store_true", help="Re-parse every workbook and recompute and re-render every sheet, without reading or updating the caches")
+    parser.add_argument("--no-plots", action="store_true", help="Only write the summary table; plots can be rendered later with the 'plot' command")
+    parser.add_argument("--format", nargs='+', choices=list(RESULT_FORMATS), default=['excel'], help="Summary outputs: excel (formatted table), parquet and/or arrow (typed, full precision; need pyarrow) (default: excel)")
+    parser.add_argument("--store", help="Parquet dataset folder; each run appends its typed results as a new part file")
+    parser.add_argument("--timings", action="store_true", help="Print the wall time of each stage, including start-up")
+    parser.add_argument("--fit", choices=FIT_METHODS, default='ols', help="Regression: ols (ordinary least squares on the level means), wls (weighted by 1/SD² of each level's replicate AUCs), replicates (on every replicate AUC, with a lack-of-fit test), or the robust huber or theil-sen lines (default: ols)")
+    parser.add_argument("--auc", choices=list(AUC_ENGINES), default='trapz', help="Area under the curve: trapz (trapezoid rule), simpson (Simpson's rule), baseline (trapezoid above the level each well settles to) or kinetic (area of a fitted rise-and-decay curve) (default: trapz)")
+    parser.add_argument("--outliers", choices=OUTLIER_TESTS, help="Leave out the replicate well of a level that Grubbs' or Dixon's Q test rejects (at most one per level)")
+    parser.add_argument("--outlier-alpha", type=float, default=0.05, help="Significance level of the outlier test (default: 0.05; Dixon accepts 0.10, 0.05 or 0.01)")
+    parser.add_argument("--bootstrap", type=int, default=0, metavar="N", help="Add percentile confidence intervals of the concentration, slope and LOD from N resamples of the replicates (e.g. 10000)")
+    parser.add_argument("--monte-carlo", type=int, default=0, metavar="N", help="Add confidence intervals of the concentration (well and sample), LOD and LOQ from N Monte Carlo draws (e.g. 100000)")
+    parser.add_argument("--mc-mode", choices=MONTE_CARLO_MODES, default='covariance', help="Monte Carlo draws: covariance (slope and intercept from the fit) or replicates (replicate noise on the AUCs, refitted) (default: covariance)")
+    parser.add_argument("--ci-level", type=float, default=95, help="Confidence level of the intervals, in percent (default: 95)")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed of the resampling, for reproducible intervals (default: 0)")
+    parser.add_argument("--sweep", type=_parse_sweep, help="Also write Results/sweep_results.xlsx with the concentrations and LOD/LOQ of every sheet for each value of one constant, e.g. dilution_factor=10,20,50")
+    add_layout_arguments(parser)
+    add_constant_arguments(parser)
+    args = parser.parse_args(argv)
+    layout = layout_from_args(parser, args)
+    constants, metadata = constants_from_args(parser, args)
+    if args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    if args.bootstrap < 0 or args.monte_carlo < 0 or not 0 < args.ci_level < 100:
+        parser.error("--bootstrap and --monte-carlo must be positive and --ci-level between 0 and 100")
+    if not 0 < args.outlier_alpha < 1 or (args.outliers == 'dixon' and args.outlier_alpha not in DIXON_CRITICAL):
+        parser.error(f"--outlier-alpha must be between 0 and 1, and one of {', '.join(map(str, DIXON_CRITICAL))} for Dixon")
+    if args.outliers and (layout.replicates < 3 or (args.outliers == 'dixon' and layout.replicates > 10)):
+        parser.error("--outliers needs at least 3 replicates, and at most 10 for Dixon")
+    if args.bootstrap and args.monte_carlo:
+        parser.error("use either --bootstrap or --monte-carlo")
+    if (args.store or set(args.format) - {'excel'}) and not _has_pyarrow():
+        parser.error("parquet/arrow output needs pyarrow (pip install pyarrow)")
+
+    # 2️⃣ Map user input to chemical symbol
+    unit_symbol = unit_map[args.unit]
+
+    input_files = resolve_inputs(args.input)
+    if not input_files:
+        parser.error(f"no input workbooks found in: {' '.join(args.input)}")
+    batch = len(input_files) > 1
+    if batch:
+        print(f"📂 Input files: {len(input_files)} workbooks")
+    else:
+        print(f"📂 Input file: {input_files[0]}")
+    print(f"⚗️ Unit for caffeic acid: {unit_symbol}")
+
+    # Create folder for saving graphs
+    output_folder = 'Results/graphs'
+    if not args.no_plots:
+        os.makedirs(output_folder, exist_ok=True)
+
+    timings = [('startup', time.perf_counter())]
+    if args.jobs > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        executor = ProcessPoolExecutor(max_workers=args.jobs)
+    else:
+        executor = None
+    try:
+        # 3️⃣ Read every workbook, then integrate and fit all of their sheets in one batch
+        result = analyze(input_files, args.unit, executor, args.sheet_column, layout, parse_cache=not args.no_cache,
+                         constants=constants, metadata=metadata, fit_method=args.fit,
+                         outlier_test=args.outliers, outlier_alpha=args.outlier_alpha, auc_engine=args.auc)
+        if args.bootstrap:
+            result.bootstrap(args.bootstrap, args.ci_level / 100, args.seed)
+        elif args.monte_carlo:
+            result.monte_carlo(args.monte_carlo, args.ci_level / 100, args.seed, args.mc_mode)
+        sheets = result.sheets()
+        timings.append(('analysis', time.perf_counter()))
+
+        folders = plot_folders(input_files)
+        tasks = [(sheet, None if args.no_plots else plot_filename(output_folder, sheet.sheet_name, sheet.source if batch else None, folders))
+                 for sheet in sheets]
+        for folder in {os.path.dirname(filename) for _, filename in tasks if filename}:
+            os.makedirs(folder, exist_ok=True)
+
+        # Unchanged sheets (same raw cells and options) are served from the cache
+        summary_data = [None] * len(tasks)
+        keys = [None] * len(tasks)
+        if not args.no_cache:
+            options = {'unit': unit_symbol, 'layout': asdict(layout), 'sheet_column': args.sheet_column, 'fit_method': args.fit,
+                       'auc_engine': args.auc}
+            if args.outliers:
+                options['outliers'] = [args.outliers, args.outlier_alpha]
+            if args.bootstrap:
+                options['bootstrap'] = [args.bootstrap, args.ci_level, args.seed]
+            elif args.monte_carlo:
+                options['monte_carlo'] = [args.monte_carlo, args.mc_mode, args.ci_level, args.seed]
+            for k, (sheet, filename) in enumerate(tasks):
+                digest = result.plate.digests[k]
+                if digest is not None and not sheet.error:
+                    sheet_constants = {name: getattr(sheet, name) for name in DEFAULT_CONSTANTS}
+                    keys[k] = cache_key(digest, sheet.sheet_name, {**options, **sheet_constants})
+                    summary_data[k] = cache_lookup(args.cache_dir, keys[k], filename)
+        pending = [k for k, row in enumerate(summary_data) if row is None]
+        if len(pending) < len(tasks):
+            print(f"♻️ {len(tasks) - len(pending)} of {len(tasks)} sheets unchanged, reused from cache")
+
+        # 4️⃣ Loop through sheets (map keeps the workbook's sheet order)
+        pending_tasks = [tasks[k] for k in pending]
+        if executor:
+            rows = executor.map(process_sheet, pending_tasks)
+        else:
+            rows = map(process_sheet, pending_tasks)
+        for k, row in zip(pending, rows):
+            summary_data[k] = row
+            if keys[k] is not None and 'Error' not in row:
+                cache_store(args.cache_dir, keys[k], row, tasks[k][1])
+        timings.append(('plots and summary', time.perf_counter()))
+    finally:
+        if executor:
+            executor.shutdown()
+
+    if batch:
+        summary_data = [{'Source file': sheet.source, **row} for sheet, row in zip(sheets, summary_data)]
+    for row in summary_data:
+        if 'Error' in row:
+            where = f"{row['Source file']}: " if batch else ''
+            print(f"⚠️ {where}Sheet '{row['Sheet name']}' failed: {row['Error']}")
+    for sheet_name, source, cells in zip(result.plate.sheet_names, result.plate.sources, result.plate.coerced):
+        if cells:
+            where = f"{source}: " if batch else ''
+            listed = ', '.join(cells[:5]) + (', ...' if len(cells) > 5 else '')
+            print(f"ℹ️ {where}Sheet '{sheet_name}': {len(cells)} text cells converted to numbers ({listed})")
+    for sheet in sheets:
+        if sheet.rejected_wells:
+            where = f"{sheet.source}: " if batch else ''
+            print(f"ℹ️ {where}Sheet '{sheet.sheet_name}': outlier wells left out ({', '.join(sheet.rejected_wells)})")
+
+    # Save table
+    path_save = 'Results'
+    os.makedirs(path_save, exist_ok=True)
+    summary_files = []
+    if 'excel' in args.format:
+        summary_df = summary_frame(summary_data)
+        summary_files.append(os.path.join(path_save, 'summary_results.xlsx'))
+        summary_df.to_excel(summary_files[-1], index=False)
+    if args.store or set(args.format) - {'excel'}:
+        results = result.to_frame([sheet.error or row.get('Error') for sheet, row in zip(sheets, summary_data)])
+        for fmt in args.format:
+            if fmt != 'excel':
+                summary_files.append(os.path.join(path_save, f'summary_results{RESULT_FORMATS[fmt]}'))
+                write_results(results, summary_files[-1])
+        if args.store:
+            summary_files.append(append_to_store(results, args.store))
+    if args.sweep:
+        summary_files.append(os.path.join(path_save, 'sweep_results.xlsx'))
+        result.sweep(*args.sweep).to_excel(summary_files[-1], index=False)
+    if not args.no_cache:
+        cache_evict(args.cache_dir, args.cache_size * 1024**2)
+    timings.append(('export', time.perf_counter()))
+
+    print()
+    for summary_file in summary_files:
+        print(f"✅ Summary table saved as: {summary_file}")
+    if not args.no_plots:
+        print(f"📊 Graphs saved in folder: '{output_folder}'")
+    print("🎯 Done! Includes concentration, uncertainty, LOD, LOQ, and corrected naming.")
+    if args.timings:
+        previous = _START
+        for stage, stamp in timings:
+            print(f"⏱️ {stage}: {stamp - previous:.3f} s")
+            previous = stamp
+
+def _parse_values(text):
+    return np.array([float(val) for val in str(text).split(',')]) if str(text).strip() else np.empty(0)
+
+def _curves_from_excel(path, parser):
+    summary_df = pd.read_excel(path, dtype=str)
+    concentration_columns = [c for c in summary_df.columns if c.startswith('[Caffeic acid] (')]
+    if not concentration_columns:
+        parser.error(f"{path} is not a summary table written by script.py")
+    concentration_column = concentration_columns[0]
+    unit_symbol = concentration_column[len('[Caffeic acid] ('):-1]
+
+    for row in summary_df.to_dict('records'):
+        if isinstance(row.get('Error'), str):
+            continue
+        yield (row.get('Source file'), row['Sheet name'], unit_symbol,
+               _parse_values(row[concentration_column]), _parse_values(row['Average AUC']), _parse_values(row['SD (AUC)']),
+               float(row['Slope']), float(row['Intercept']), float(row['R']), None)
+
+def _curves_from_results(results):
+    batch = results['source_file'].nunique() > 1
+    for row in results[results['error'].isna()].itertuples(index=False):
+        yield (row.source_file if batch else None, row.sheet_name, row.unit,
+               np.asarray(row.concentrations, dtype=float), np.asarray(row.mean_auc, dtype=float), np.asarray(row.sd_auc, dtype=float),
+               row.slope, row.intercept, row.r, getattr(row, 'time_unit', None))
+
+# 'plot' command: render the graphs later from a saved summary table
+def plot_main(argv):
+    parser = argparse.ArgumentParser(prog="script.py plot", description="Render the regression plots from a saved summary table")
+    parser.add_argument("results", nargs='?', default=os.path.join('Results', 'summary_results.xlsx'), help="Summary table (.xlsx, .parquet, .arrow or a --store folder) written by a previous run (default: Results/summary_results.xlsx)")
+    parser.add_argument("-o", "--output", default=os.path.join('Results', 'graphs'), help="Folder for the graphs (default: Results/graphs)")
+    args = parser.parse_args(argv)
+
+    if args.results.endswith('.xlsx'):
+        curves = _curves_from_excel(args.results, parser)
+    else:
+        curves = _curves_from_results(read_results(args.results))
+
+    curves = list(curves)
+    folders = plot_folders(source for source, *_ in curves if source is not None)
+    count = 0
+    for source, sheet_name, unit_symbol, x, y, y_err, slope, intercept, r_value, time_unit in curves:
+        filename = plot_filename(args.output, sheet_name, source, folders)
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        render_plot(filename, sheet_name, unit_symbol, x, y, y_err, slope, intercept, r_value, time_unit)
+        count += 1
+
+    print(f"📊 {count} graphs saved in folder: '{args.output}'")
+
+# 'reanalyze' command: recompute the columns derived from the fit with new assay
+# constants, straight from a typed results table; nothing is parsed, integrated or fitted
+
+def _sheet_from_row(row) -> SheetResult:
+    return SheetResult(
+        source=row.source_file, sheet_name=row.sheet_name, unit_symbol=row.unit,
+        concentrations=np.asarray(row.concentrations, dtype=float), mean_auc=np.asarray(row.mean_auc, dtype=float),
+        sd_auc=np.asarray(row.sd_auc, dtype=float), slope=row.slope, intercept=row.intercept, r=row.r,
+        s_yx=row.residual_sd, se_slope=row.se_slope, se_intercept=row.se_intercept, F=row.f_value, p=row.prob_f,
+        conc=row.conc, conc_err=row.conc_err, LOD=row.lod, LOQ=row.loq,
+        error=None if pd.isna(row.error) else row.error, fit_method=getattr(row, 'fit_method', 'ols'),
+        lack_of_fit_F=getattr(row, 'lack_of_fit_f', np.nan), lack_of_fit_p=getattr(row, 'lack_of_fit_p', np.nan),
+        outlier_test=None if pd.isna(getattr(row, 'outlier_test', None)) else row.outlier_test,
+        rejected_wells=list(getattr(row, 'rejected_wells', [])), auc_engine=getattr(row, 'auc_engine', 'trapz'),
+        **{name: getattr(row, name) for name in DEFAULT_CONSTANTS if hasattr(row, name)},
+        **_intervals_from_row(row))
+
+def _intervals_from_row(row) -> dict:
+    ci_level = getattr(row, 'ci_level', np.nan)
+    intervals = {name: (getattr(row, f'{name}_ci_low'), getattr(row, f'{name}_ci_high')) for name in INTERVAL_LABELS
+                 if pd.notna(getattr(row, f'{name}_ci_low', np.nan))}
+    return {'intervals': intervals, 'ci_level': ci_level} if intervals and pd.notna(ci_level) else {}
+
+def reanalyze_results(results: pd.DataFrame, **constants) -> pd.DataFrame:
+    """Recompute LOD/LOQ and the corrected concentrations of a typed results table.
+
+    Constants that are not given keep the value stored with each sheet.
+    Confidence intervals are rescaled with the new constants.
+    """
+    stored = {name: results[name].to_numpy(dtype=float) if name in results else default
+              for name, default in DEFAULT_CONSTANTS.items()}
+    for name in DEFAULT_CONSTANTS:
+        if constants.get(name) is None:
+            constants[name] = stored[name]
+    fit = results[['slope', 'residual_sd', 'conc', 'conc_err']].to_numpy(dtype=float).T
+    columns = derived_columns(*fit, **constants)
+
+    # Every interval is proportional to the constants it depends on
+    well = stored['volume_correction'] / columns['volume_correction']
+    scale = {
+        'conc_well': well,
+        'conc_sample': well * columns['dilution_factor'] / stored['dilution_factor'],
+        'lod': columns['lod_factor'] / stored['lod_factor'],
+        'loq': columns['loq_factor'] / stored['loq_factor'],
+    }
+    for name, factor in scale.items():
+        for side in ('low', 'high'):
+            if f'{name}_ci_{side}' in results:
+                columns[f'{name}_ci_{side}'] = results[f'{name}_ci_{side}'].to_numpy(dtype=float) * factor
+    return results.assign(**columns)
+
+def reanalyze_main(argv):
+    parser = argparse.ArgumentParser(prog="script.py reanalyze", description="Recompute concentrations and LOD/LOQ of saved results with new constants, without the raw data")
+    parser.add_argument("results", help="Typed results (.parquet, .arrow or a --store folder) written by a previous run")
+    parser.add_argument("-o", "--output", default=os.path.join('Results', 'reanalysis_results.parquet'), help="Output table: .parquet or .arrow (typed) or .xlsx (formatted summary) (default: Results/reanalysis_results.parquet)")
+    parser.add_argument("--dilution-factor", type=float, help="Dilution factor of the original sample (default: value stored with each sheet)")
+    parser.add_argument("--volume-correction", type=float, help="Well volume correction the concentrations are divided by (default: value stored with each sheet)")
+    parser.add_argument("--lod-factor", type=float, help="LOD multiplier of the residual SD over the slope (default: value stored with each sheet)")
+    parser.add_argument("--loq-factor", type=float, help="LOQ multiplier of the residual SD over the slope (default: value stored with each sheet)")
+    args = parser.parse_args(argv)
+    if not args.output.endswith(tuple(RESULT_FORMATS.values())):
+        parser.error(f"output must end with one of: {' '.join(RESULT_FORMATS.values())}")
+    if not _has_pyarrow():
+        parser.error("reading typed results needs pyarrow (pip install pyarrow)")
+
+    results = read_results(args.results)
+    start = time.perf_counter()
+    results = reanalyze_results(results, dilution_factor=args.dilution_factor, volume_correction=args.volume_correction,
+                                lod_factor=args.lod_factor, loq_factor=args.loq_factor)
+    elapsed = time.perf_counter() - start
+
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    if args.output.endswith('.xlsx'):
+        batch = results['source_file'].nunique() > 1
+        summary_data = []
+        for row in results.itertuples(index=False):
+            sheet = _sheet_from_row(row)
+            summary_row = ({'Sheet name': sheet.sheet_name, 'Error': sheet.error} if sheet.error
+                           else format_summary_row(sheet))
+            summary_data.append({'Source file': sheet.source, **summary_row} if batch else summary_row)
+        summary_frame(summary_data).to_excel(args.output, index=False)
+    else:
+        write_results(results, args.output)
+    print(f"♻️ {len(results)} sheets recomputed in {elapsed * 1000:.1f} ms")
+    print(f"✅ Summary table saved as: {args.output}")
 
+# 'watch' command: a long-running service that processes every workbook dropped in an
+# inbox folder. Imports, the plot renderer and the worker processes stay warm between
+# plates; results are appended to a --store dataset and the files are moved to
+# processed/ or failed/ inside the inbox.
 
+def _warm_up(plots):
+    from scipy.stats import f  # noqa: F401
+    np.empty(0), pd.DataFrame()
+    if plots:
+        global _renderer
+        if _renderer is None:
+            _renderer = PlotRenderer()
 
+# Runs in a worker: the typed results of one workbook, plus its plots unless output_folder is None
+def process_inbox_file(path, options, output_folder):
+    result = analyze([path], **options)
+    errors = []
+    for sheet in result.sheets():
+        filename = None if output_folder is None else plot_filename(output_folder, sheet.sheet_name, sheet.source)
+        if filename:
+            os.makedirs(os.path.dirname(filename), exist_ok=True)
+        row = process_sheet((sheet, filename))
+        errors.append(sheet.error or row.get('Error'))
+    return result.to_frame(errors)
 
+def _inbox_files(inbox):
+    for entry in os.scandir(inbox):
+        # Skip hidden files and the lock files Excel keeps next to an open workbook
+        if (entry.is_file() and not entry.name.startswith(('.', '~$'))
+                and os.path.splitext(entry.name)[1].lower() in INPUT_EXTENSIONS):
+            stat = entry.stat()
+            yield entry.path, (stat.st_size, stat.st_mtime_ns)
 
+def _move_to(path, folder):
+    os.makedirs(folder, exist_ok=True)
+    target = os.path.join(folder, os.path.basename(path))
+    if os.path.exists(target):
+        stem, ext = os.path.splitext(os.path.basename(path))
+        target = os.path.join(folder, f"{stem}-{datetime.now():%Y%m%dT%H%M%S%f}{ext}")
+    shutil.move(path, target)
+    return target
 
+async def watch_inbox(inbox, executor, args, options):
+    import asyncio
 
+    loop = asyncio.get_running_loop()
+    slots = asyncio.Semaphore(args.jobs)
+    output_folder = None if args.no_plots else args.output
+    seen = {}     # path -> (size and mtime, when they last changed)
+    busy = set()
+    tasks = set()
 
+    async def handle(path):
+        name = os.path.basename(path)
+        async with slots:
+            try:
+                results = await loop.run_in_executor(executor, process_inbox_file, path, options, output_folder)
+                append_to_store(results, args.store)
+            except Exception as exc:
+                _move_to(path, os.path.join(inbox, 'failed'))
+                print(f"⚠️ {name} failed: {type(exc).__name__}: {exc}", flush=True)
+            else:
+                _move_to(path, os.path.join(inbox, 'processed'))
+                failed = int(results['error'].notna().sum())
+                print(f"✅ {name}: {len(results)} sheets appended to {args.store}" + (f" ({failed} failed)" if failed else ''), flush=True)
+            finally:
+                busy.discard(path)
+                seen.pop(path, None)
 
+    while True:
+        # Debounce: a file is only picked up once its size and mtime have been
+        # stable for --settle seconds, so partially copied workbooks are left alone
+        now = time.monotonic()
+        current = dict(_inbox_files(inbox))
+        for path in seen.keys() - current.keys():
+            del seen[path]
+        for path, signature in current.items():
+            if path in busy:
+                continue
+            previous = seen.get(path)
+            if previous is None or previous[0] != signature:
+                seen[path] = (signature, now)
+            elif now - previous[1] >= args.settle:
+                busy.add(path)
+                task = asyncio.create_task(handle(path))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        if args.once and not seen and not busy:
+            break
+        await asyncio.sleep(args.interval)
 
+def watch_main(argv):
+    import asyncio
+    import signal
+    from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
+    parser = argparse.ArgumentParser(prog="script.py watch", description="Watch an inbox folder and process every workbook dropped in it")
+    parser.add_argument("inbox", help="Folder to watch for .xlsx/.csv/.tsv files")
+    parser.add_argument("--store", default=os.path.join('Results', 'store'), help="Parquet dataset folder the results are appended to (default: Results/store)")
+    parser.add_argument("-u", "--unit", choices=["micromolar", "millimolar"], default="micromolar", help="Unit for caffeic acid concentration (micromolar or millimolar)")
+    parser.add_argument("--sheet-column", type=int, help="CSV/TSV only: 0-based column holding the sheet name of each row (default: one sheet per file)")
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="Number of workbooks processed at the same time (default: 1)")
+    parser.add_argument("-o", "--output", default=os.path.join('Results', 'graphs'), help="Folder for the graphs (default: Results/graphs)")
+    parser.add_argument("--no-plots", action="store_true", help="Only append the results to the store")
+    parser.add_argument("--interval", type=float, default=1.0, help="Seconds between scans of the inbox (default: 1)")
+    parser.add_argument("--settle", type=float, default=2.0, help="Seconds a file's size and mtime must stay unchanged before it is processed (default: 2)")
+    parser.add_argument("--once", action="store_true", help="Process the files already in the inbox, then exit")
+    parser.add_argument("--fit", choices=FIT_METHODS, default='ols', help="Regression: ols, wls (weighted by 1/SD² of the replicate AUCs), replicates (on every replicate AUC), huber or theil-sen (default: ols)")
+    parser.add_argument("--auc", choices=list(AUC_ENGINES), default='trapz', help="Area under the curve: trapz, simpson, baseline or kinetic (default: trapz)")
+    parser.add_argument("--outliers", choices=OUTLIER_TESTS, help="Leave out the replicate well of a level that Grubbs' or Dixon's Q test rejects")
+    parser.add_argument("--outlier-alpha", type=float, default=0.05, help="Significance level of the outlier test (default: 0.05)")
+    add_layout_arguments(parser)
+    add_constant_arguments(parser)
+    args = parser.parse_args(argv)
+    constants, metadata = constants_from_args(parser, args)
+    options = {'unit': args.unit, 'sheet_column': args.sheet_column, 'layout': layout_from_args(parser, args),
+               'constants': constants, 'metadata': metadata, 'fit_method': args.fit,
+               'outlier_test': args.outliers, 'outlier_alpha': args.outlier_alpha, 'auc_engine': args.auc}
+    if args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    if not 0 < args.outlier_alpha < 1 or (args.outliers == 'dixon' and args.outlier_alpha not in DIXON_CRITICAL):
+        parser.error(f"--outlier-alpha must be between 0 and 1, and one of {', '.join(map(str, DIXON_CRITICAL))} for Dixon")
+    replicates = options['layout'].replicates
+    if args.outliers and (replicates < 3 or (args.outliers == 'dixon' and replicates > 10)):
+        parser.error("--outliers needs at least 3 replicates, and at most 10 for Dixon")
+    if not os.path.isdir(args.inbox):
+        parser.error(f"inbox folder not found: {args.inbox}")
+    if not _has_pyarrow():
+        parser.error("the results store needs pyarrow (pip install pyarrow)")
 
+    # One thread keeps the event loop free to scan while a plate is processed;
+    # with --jobs > 1 plates are processed in parallel worker processes
+    executor = ProcessPoolExecutor(max_workers=args.jobs) if args.jobs > 1 else ThreadPoolExecutor(max_workers=1)
+    for _ in range(args.jobs):
+        executor.submit(_warm_up, not args.no_plots)
+    # A service manager stops the daemon with SIGTERM; treat it like Ctrl+C
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    print(f"👀 Watching '{args.inbox}' (results: {args.store}, Ctrl+C to stop)", flush=True)
+    try:
+        asyncio.run(watch_inbox(args.inbox, executor, args, options))
+    except KeyboardInterrupt:
+        print("🛑 Stopped watching", flush=True)
+    finally:
+        executor.shutdown()
 
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+import os
+import shutil
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+from scipy import integrate, stats
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import script  # noqa: E402
+
+TEMPLATE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Example', 'template.xlsx')
+
+
+@pytest.fixture(scope='module')
+def template_result():
+    return script.analyze(TEMPLATE)
+
+
+# Regression kernel
+
+def test_fit_matches_linregress():
+    rng = np.random.default_rng(1)
+    x = np.array([0.0, 1.25, 2.5, 5.0])
+    y = 2000 * x + 8000 + rng.normal(0, 300, (6, 4))
+    fit = script.fit_standard_addition(np.broadcast_to(x, y.shape), y)
+    for k in range(len(y)):
+        ref = stats.linregress(x, y[k])
+        assert fit.slope[k] == pytest.approx(ref.slope)
+        assert fit.intercept[k] == pytest.approx(ref.intercept)
+        assert fit.r[k] == pytest.approx(ref.rvalue)
+        assert fit.se_slope[k] == pytest.approx(ref.stderr)
+        assert fit.se_intercept[k] == pytest.approx(ref.intercept_stderr)
+        assert fit.conc[k] == pytest.approx(-ref.intercept / ref.slope)
+
+
+def test_weighted_fit_matches_weighted_least_squares():
+    x = np.array([0.0, 1.25, 2.5, 5.0])
+    y = np.array([7527.5, 11079.7, 13743.2, 19186.2])
+    w = np.array([1.0, 0.5, 2.0, 0.25])
+    w = w / w.mean()  # the kernel expects weights normalized to mean 1
+    fit = script.fit_standard_addition(x, y, weights=w)
+    design = np.column_stack([x, np.ones_like(x)]) * np.sqrt(w)[:, np.newaxis]
+    slope, intercept = np.linalg.lstsq(design, y * np.sqrt(w), rcond=None)[0]
+    assert fit.slope == pytest.approx(slope)
+    assert fit.intercept == pytest.approx(intercept)
+
+
+def test_replicate_fit_and_lack_of_fit():
+    rng = np.random.default_rng(2)
+    x = np.array([[0.0, 1.25, 2.5, 5.0]])
+    replicate_auc = 2000 * x[..., np.newaxis] + 8000 + rng.normal(0, 300, (1, 4, 3))
+    fit = script.fit_replicates(x, replicate_auc)
+    ref = stats.linregress(np.repeat(x[0], 3), replicate_auc[0].ravel())
+    assert fit.slope[0] == pytest.approx(ref.slope)
+    assert fit.intercept[0] == pytest.approx(ref.intercept)
+
+    lof = script.lack_of_fit_test(x, replicate_auc, fit)
+    assert lof.ss_lack[0] + lof.ss_pure[0] == pytest.approx(fit.s_yx[0]**2 * (12 - 2))
+    assert lof.F[0] == pytest.approx((lof.ss_lack[0] / 2) / (lof.ss_pure[0] / 8))
+
+    # A rejected well is left out of the points
+    rejected = np.zeros(replicate_auc.shape, dtype=bool)
+    rejected[0, 2, 1] = True
+    fit = script.fit_replicates(x, replicate_auc, rejected=rejected)
+    kept = ~rejected[0].ravel()
+    ref = stats.linregress(np.repeat(x[0], 3)[kept], replicate_auc[0].ravel()[kept])
+    assert fit.slope[0] == pytest.approx(ref.slope)
+
+
+# AUC engines
+
+def test_simpson_matches_scipy():
+    rng = np.random.default_rng(3)
+    time = np.cumsum(rng.uniform(0.5, 1.5, (2, 31)), axis=1)
+    rlu = rng.uniform(0, 1000, (2, 31, 6))
+    area = script.simpson_area(time, rlu)
+    for k in range(2):
+        assert area[k] == pytest.approx(integrate.simpson(rlu[k], x=time[k], axis=0), rel=1e-10)
+
+
+# Outliers
+
+@pytest.mark.parametrize('test', script.OUTLIER_TESTS)
+def test_outlier_decisions(test):
+    replicate_auc = np.array([[[10.0, 10.1, 9.9, 10.05, 14.0],
+                               [10.0, 10.1, 9.9, 10.05, 10.2]]])
+    rejected = script.screen_outliers(replicate_auc, np.ones((1, 2), dtype=bool), test, 0.05)
+    assert rejected.tolist() == [[[False, False, False, False, True], [False] * 5]]
+
+
+def test_dixon_needs_table_replicates():
+    with pytest.raises(ValueError):
+        script.screen_outliers(np.zeros((1, 1, 11)), np.ones((1, 1), dtype=bool), 'dixon', 0.05)
+
+
+# Template workbook
+
+def test_template_summary(template_result):
+    summary = script.summary_frame([script.format_summary_row(sheet) for sheet in template_result.sheets()])
+    assert len(summary) == 20
+    assert list(summary.columns[-3:]) == ['Concentration ×20 (± error)', 'LOD ×20', 'LOQ ×20']
+    first = summary.iloc[0]
+    assert first['Sheet name'] == 'roasted coffee infusion'
+    assert first['R'] == '0.998'
+    assert first['Slope'] == '2296.850'
+    assert first['Concentration (± error)'] == '3.457 ± 0.198'
+    assert first['Concentration ×20 (± error)'] == '69.131 ± 3.950'
+    assert first['LOQ ×20'] == '32.404'
+
+
+def test_reanalyze_rescales_values_and_intervals():
+    result = script.analyze(TEMPLATE)
+    result.bootstrap(200, 0.95, seed=0)
+    results = result.to_frame()
+    again = script.reanalyze_results(results, dilution_factor=40, volume_correction=0.5)
+    well = 0.99 / 0.5
+    np.testing.assert_allclose(again['conc_well'], results['conc_well'] * well)
+    np.testing.assert_allclose(again['conc_sample'], results['conc_sample'] * well * 2)
+    np.testing.assert_allclose(again['conc_sample_ci_high'], results['conc_sample_ci_high'] * well * 2)
+    np.testing.assert_allclose(again['conc_well_ci_low'], results['conc_well_ci_low'] * well)
+    np.testing.assert_allclose(again['lod'], results['lod'])
+
+
+# Caches
+
+def test_parsed_cache_round_trip(tmp_path):
+    path = str(tmp_path / 'template.xlsx')
+    shutil.copy(TEMPLATE, path)
+    parsed = script.load_workbooks([path], parse_cache=True)
+    assert os.path.exists(os.path.join(script.parsed_cache_dir(path), 'manifest.json'))
+    cached = script.load_workbooks([path], parse_cache=True)
+    assert cached.sheet_names == parsed.sheet_names
+    np.testing.assert_array_equal(cached.time, parsed.time)
+    np.testing.assert_array_equal(cached.rlu, parsed.rlu)
+    np.testing.assert_array_equal(cached.concentrations, parsed.concentrations)
+
+
+def test_parsed_cache_without_data_sheets(tmp_path):
+    path = str(tmp_path / 'metadata_only.xlsx')
+    with pd.ExcelWriter(path) as writer:
+        pd.DataFrame({'sheet': ['a'], 'dilution_factor': [10]}).to_excel(writer, sheet_name='metadata', index=False)
+    for _ in range(2):
+        assert len(script.analyze(path, parse_cache=True)) == 0
+
+
+def test_result_cache_round_trip(tmp_path):
+    row = {'Sheet name': 'red wine', 'Concentration (± error)': '1.000 ± 0.100'}
+    key = script.cache_key('digest', 'red wine', {'unit': 'micromolar'})
+    assert key != script.cache_key('digest', 'red wine', {'unit': 'millimolar'})
+    assert script.cache_lookup(str(tmp_path), key, None) is None
+    script.cache_store(str(tmp_path), key, row, None)
+    assert script.cache_lookup(str(tmp_path), key, None) == row
+
+
+def test_results_table_round_trip(tmp_path, template_result):
+    pytest.importorskip('pyarrow')
+    results = template_result.to_frame()
+    path = str(tmp_path / 'results.parquet')
+    script.write_results(results, path)
+    loaded = script.read_results(path)
+    assert list(loaded.columns) == list(results.columns)
+    np.testing.assert_allclose(loaded['conc_sample'], results['conc_sample'])
+    for stored, original in zip(loaded['mean_auc'], results['mean_auc']):
+        np.testing.assert_allclose(stored, original)
+
+    store = str(tmp_path / 'store')
+    script.append_to_store(results, store)
+    script.append_to_store(results, store)
+    assert len(script.read_results(store)) == 2 * len(results)